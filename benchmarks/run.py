@@ -0,0 +1,242 @@
+"""Pipeline benchmarks: python -m benchmarks.run [--sizes 1e5 1e6] [--output results.json]
+
+Generates synthetic 10-minute wind records, times every pipeline stage
+separately and writes the timings as JSON. With --baseline the run is compared
+against an earlier results file and exits with status 1 if any stage got slower
+than the allowed tolerance.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetic import synthetic_columns, synthetic_frame
+from src.windrose.binning import CountAccumulator, count_matrix, window_mask
+from src.windrose.export import frequency_table, write_xml
+from src.windrose.ingest import parse_columns, read_table
+from src.windrose.pipeline import column_names
+from src.windrose.timecube import TimeCube
+from src.windrose.uncertainty import BlockCounts, confidence_intervals
+
+SETTINGS = {
+    'date_time_col': 'Date & Time',
+    'wind_speed_col': 'Wind Speed',
+    'wind_dir_col': 'Wind Direction',
+    'date_format': 'yyyy-MM-dd HH:mm:ss',
+}
+SPEED_RANGES = [(2.0, 4.9), (5.0, 6.9), (7.0, 9.9), (10.0, 14.9), (15.0, 19.9), (20.0, 100.0)]
+N_DIR = 16
+# Excel sheets hold at most 1,048,576 rows, and reading one with openpyxl takes
+# about a minute per million rows, so larger workbooks are opt-in
+EXCEL_MAX_ROWS = 1_048_575
+DEFAULT_EXCEL_ROWS = 200_000
+CSV_CHUNK_ROWS = 1_000_000
+# Dates are parsed from text frames of at most this many rows (about 80 MB
+# each) and the chunk times summed, so large sizes do not need the whole
+# record as text in memory
+PARSE_CHUNK_ROWS = 1_000_000
+DEFAULT_SIZES = (100_000, 1_000_000)
+DEFAULT_TOLERANCE = 0.25
+INTERVAL_REPLICATES = 2000
+# Differences below this many seconds are treated as noise
+MIN_DELTA = 0.005
+
+
+def best_of(repeat, fn):
+    # Minimum wall time over repeat runs, and the last result
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def data_file(data_dir, n_rows, ext):
+    path = os.path.join(data_dir, f'wind_{n_rows}{ext}')
+    if os.path.exists(path):
+        return path
+    os.makedirs(data_dir, exist_ok=True)
+    scratch = os.path.join(data_dir, f'.tmp-wind_{n_rows}{ext}')
+    if ext == '.csv':
+        # written in chunks so 10^8 rows never need a full text frame in memory
+        frame = None
+        for first in range(0, n_rows, CSV_CHUNK_ROWS):
+            count = min(CSV_CHUNK_ROWS, n_rows - first)
+            frame = synthetic_frame(count, seed=first, start_row=first)
+            frame.to_csv(scratch, mode='w' if first == 0 else 'a', header=first == 0, index=False)
+        del frame
+    else:
+        synthetic_frame(n_rows).to_excel(scratch, index=False, engine='openpyxl')
+    os.replace(scratch, path)
+    return path
+
+
+def render_figure(result):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from src.windrose.render import draw_rose
+
+    figure = Figure(figsize=(8, 8))
+    FigureCanvasAgg(figure)
+    draw_rose(figure, result, 'benchmark', 'start', 'end')
+    figure.savefig(io.BytesIO(), format='png', dpi=300, bbox_inches='tight')
+
+
+def run_size(n_rows, repeat, data_dir, excel_max_rows, skip):
+    timings = {}
+
+    def record(name, seconds):
+        timings[name] = seconds
+        print(f'  {name:<16} {seconds * 1000:10.1f} ms', flush=True)
+
+    def stage(name, fn):
+        if name in skip:
+            return None
+        seconds, result = best_of(repeat, fn)
+        record(name, seconds)
+        return result
+
+    # the loads read the three columns the application reads
+    if 'load_csv' not in skip:
+        csv_path = data_file(data_dir, n_rows, '.csv')
+        stage('load_csv', lambda: read_table(csv_path, column_names(SETTINGS)))
+    if n_rows <= excel_max_rows and 'load_excel' not in skip:
+        excel_path = data_file(data_dir, n_rows, '.xlsx')
+        stage('load_excel', lambda: read_table(excel_path, column_names(SETTINGS)))
+
+    if 'parse' not in skip:
+        seconds = 0.0
+        for first in range(0, n_rows, PARSE_CHUNK_ROWS):
+            frame = synthetic_frame(min(PARSE_CHUNK_ROWS, n_rows - first), seed=first,
+                                    start_row=first)
+            seconds += best_of(repeat, lambda: parse_columns(frame, **SETTINGS))[0]
+            del frame
+        record('parse', seconds)
+    timestamps, speed, direction = synthetic_columns(n_rows)
+
+    # the middle half of the record
+    span = timestamps[-1] - timestamps[0]
+    start, end = timestamps[0] + span // 4, timestamps[0] + 3 * span // 4
+
+    def date_filter():
+        # selecting the window's rows only; binning them is the next stage
+        mask = window_mask(timestamps, start, end)
+        return timestamps[mask], speed[mask], direction[mask]
+
+    stage('date_filter', date_filter)
+    stage('binning', lambda: count_matrix(speed, direction, SPEED_RANGES, N_DIR))
+    cube = stage('cube_build', lambda: TimeCube(timestamps, speed, direction, SPEED_RANGES, N_DIR))
+    if cube is not None:
+        stage('cube_query', lambda: cube.query(start, end))
+    result = CountAccumulator(SPEED_RANGES, N_DIR, start, end)
+    result.add(timestamps, speed, direction)
+    table = stage('frequency_table', lambda: frequency_table(result))
+    if table is None:
+        table = frequency_table(result)
+    with tempfile.TemporaryDirectory() as tmp:
+        stage('xml_export', lambda: write_xml(table, SPEED_RANGES, os.path.join(tmp, 'rose.xml')))
+    stage('render', lambda: render_figure(result))
+
+    def block_counts():
+        counts = BlockCounts(SPEED_RANGES, N_DIR, start, end)
+        counts.add(timestamps, speed, direction)
+        return counts
+
+    blocks = stage('block_counts', block_counts)
+    if blocks is None:
+        blocks = block_counts()
+    stage('intervals', lambda: confidence_intervals(blocks, 'block', INTERVAL_REPLICATES))
+    return timings
+
+
+def compare(results, baseline, tolerance, stage_tolerances):
+    # Returns the list of (size, stage, baseline, current) regressions
+    regressions = []
+    for size, timings in results['results'].items():
+        base_timings = baseline.get('results', {}).get(size, {})
+        for name, seconds in timings.items():
+            if name not in base_timings:
+                continue
+            base = base_timings[name]
+            allowed = base * (1 + stage_tolerances.get(name, tolerance))
+            marker = ''
+            if seconds > allowed and seconds - base > MIN_DELTA:
+                regressions.append((size, name, base, seconds))
+                marker = '  REGRESSION'
+            print(f'{size:>12} {name:<16} {base * 1000:10.1f} -> {seconds * 1000:10.1f} ms'
+                  f' ({seconds / base if base else float("inf"):.2f}x){marker}')
+    return regressions
+
+
+def parse_stage_tolerances(values):
+    tolerances = {}
+    for value in values:
+        name, _, fraction = value.partition('=')
+        tolerances[name] = float(fraction)
+    return tolerances
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time each stage of the wind rose pipeline.")
+    parser.add_argument('--sizes', nargs='+', type=float, default=DEFAULT_SIZES,
+                        help="row counts to benchmark, e.g. 1e5 1e6 1e7 1e8")
+    parser.add_argument('--repeat', type=int, default=3, help="runs per stage; the best is kept")
+    parser.add_argument('--data-dir', default=os.path.join(os.path.dirname(__file__), '.data'),
+                        help="where generated input files are kept between runs")
+    parser.add_argument('--excel-max-rows', type=int, default=DEFAULT_EXCEL_ROWS,
+                        help=f"skip the Excel load stage above this many rows "
+                             f"(at most {EXCEL_MAX_ROWS})")
+    parser.add_argument('--skip', nargs='*', default=[], help="stages to leave out")
+    parser.add_argument('--output', help="write the results JSON here")
+    parser.add_argument('--baseline', help="results JSON to compare against")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help="allowed slowdown as a fraction of the baseline (default 0.25)")
+    parser.add_argument('--stage-tolerance', nargs='*', default=[], metavar='STAGE=FRACTION',
+                        help="per-stage overrides of --tolerance")
+    args = parser.parse_args(argv)
+    excel_max_rows = min(args.excel_max_rows, EXCEL_MAX_ROWS)
+
+    results = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'pandas': pd.__version__,
+            'platform': platform.platform(),
+            'processor': platform.processor(),
+            'repeat': args.repeat,
+        },
+        'results': {},
+    }
+    for size in args.sizes:
+        n_rows = int(size)
+        print(f'{n_rows} rows', flush=True)
+        results['results'][str(n_rows)] = run_size(n_rows, args.repeat, args.data_dir,
+                                                   excel_max_rows, set(args.skip))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance,
+                              parse_stage_tolerances(args.stage_tolerance))
+        if regressions:
+            print(f'{len(regressions)} stage(s) regressed', file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+
+from src.windrose.binning import HOUR
+
+TEN_MINUTES = 600 * 10**9
+# Prevailing sectors as (mean direction in degrees, von Mises kappa, weight,
+# Weibull scale in m/s): a strong south-westerly, a weaker north-easterly and
+# a broad background
+REGIMES = ((225, 4.0, 0.55, 9.0), (45, 3.0, 0.30, 6.5), (0, 0.0, 0.15, 5.0))
+WEIBULL_SHAPE = 2.0
+
+
+def synthetic_columns(n_rows, seed=0, start_row=0, start='2000-01-01'):
+    # Typed columns like parse_columns returns: 10-minute int64 timestamps and
+    # float32 speed/direction rounded the way loggers report them. start_row
+    # offsets the clock so a long record can be generated in pieces.
+    rng = np.random.default_rng(seed)
+    row_numbers = np.arange(start_row, start_row + n_rows, dtype=np.int64)
+    timestamps = pd.Timestamp(start).value + row_numbers * TEN_MINUTES
+    weights = np.array([regime[2] for regime in REGIMES])
+    regime = rng.choice(len(REGIMES), size=n_rows, p=weights / weights.sum())
+    direction = np.empty(n_rows)
+    speed = np.empty(n_rows)
+    for i, (mean, kappa, _, scale) in enumerate(REGIMES):
+        rows = regime == i
+        n = int(rows.sum())
+        angles = rng.vonmises(np.radians(mean), kappa, n) if kappa else rng.uniform(-np.pi, np.pi, n)
+        direction[rows] = np.degrees(angles) % 360
+        speed[rows] = scale * rng.weibull(WEIBULL_SHAPE, n)
+    # a diurnal cycle: windier in the afternoon
+    hour = (timestamps // HOUR) % 24
+    speed *= 1 + 0.2 * np.sin((hour - 9) / 24 * 2 * np.pi)
+    speed = np.round(speed, 1).astype(np.float32)
+    direction = np.round(direction).astype(np.float32)
+    return timestamps, speed, direction
+
+
+def synthetic_frame(n_rows, seed=0, start_row=0, date_format='%Y-%m-%d %H:%M:%S'):
+    # The same records as a sheet with text dates, as the loggers export them
+    timestamps, speed, direction = synthetic_columns(n_rows, seed, start_row)
+    dates = pd.to_datetime(timestamps).strftime(date_format)
+    return pd.DataFrame({'Date & Time': dates, 'Wind Speed': speed, 'Wind Direction': direction})
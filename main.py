@@ -1,9 +1,20 @@
 import sys
-from PyQt5.QtWidgets import QApplication
-from src.windrose.windrose_app import WindRoseApp
+
+from src.windrose.startup import PROFILE, profile_requested
 
 if __name__ == '__main__':
+    # imported here so startup profiling can time them
+    if profile_requested():
+        PROFILE.enable()
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+    from src.windrose.windrose_app import WindRoseApp
+    PROFILE.mark('Imports')
     app = QApplication(sys.argv)
+    PROFILE.mark('QApplication')
     window = WindRoseApp()
     window.show()
-    sys.exit(app.exec_()) 
\ No newline at end of file
+    PROFILE.mark('Show window')
+    # runs once the event loop has painted the window
+    QTimer.singleShot(0, PROFILE.finish)
+    sys.exit(app.exec_())
@@ -0,0 +1,25 @@
+from PyQt5.QtWidgets import QDialog, QVBoxLayout, QHBoxLayout, QPushButton
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.figure import Figure
+
+class GroupedRoseDialog(QDialog):
+    def __init__(self, title, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle(title)
+        self.resize(1200, 900)
+        layout = QVBoxLayout(self)
+
+        # Small-multiples figure
+        self.figure = Figure(figsize=(12, 9))
+        self.canvas = FigureCanvas(self.figure)
+        layout.addWidget(self.canvas)
+
+        # Export buttons
+        button_layout = QHBoxLayout()
+        self.export_image_button = QPushButton('Export Image')
+        self.export_table_button = QPushButton('Export Tables')
+        self.export_xml_button = QPushButton('Export XML')
+        button_layout.addWidget(self.export_image_button)
+        button_layout.addWidget(self.export_table_button)
+        button_layout.addWidget(self.export_xml_button)
+        layout.addLayout(button_layout)
@@ -0,0 +1,67 @@
+from PyQt5.QtCore import Qt, pyqtSignal
+from PyQt5.QtWidgets import (QDockWidget, QWidget, QVBoxLayout, QHBoxLayout, QTableWidget,
+                             QTableWidgetItem, QPushButton, QCheckBox, QHeaderView, QAbstractItemView)
+
+MAX_ROWS = 200
+HEADERS = ('Stage', 'Time (ms)', 'Rows', 'Peak Memory (MB)')
+
+
+def stage_summary(entry):
+    # One line for a stage record, as shown in the status bar
+    text = f"{entry['stage']}: {entry['seconds'] * 1000:.1f} ms"
+    if entry['rows'] is not None:
+        text += f", {entry['rows']:,} rows"
+    if entry['peak_bytes'] is not None:
+        text += f", {entry['peak_bytes'] / 2**20:.1f} MB peak"
+    return text
+
+
+class PerformancePanel(QDockWidget):
+    # The latest pipeline stages, newest first. recorded may be emitted from
+    # any thread; Qt queues it to the panel.
+    recorded = pyqtSignal(object)
+
+    def __init__(self, parent=None):
+        super().__init__('Performance', parent)
+        self.setObjectName('performance_panel')
+        widget = QWidget()
+        layout = QVBoxLayout(widget)
+
+        self.table = QTableWidget(0, len(HEADERS))
+        self.table.setHorizontalHeaderLabels(HEADERS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        self.table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        layout.addWidget(self.table)
+
+        button_layout = QHBoxLayout()
+        self.memory_check = QCheckBox('Track peak memory')
+        self.memory_check.setChecked(True)
+        self.clear_button = QPushButton('Clear')
+        self.clear_button.clicked.connect(self.clear)
+        button_layout.addWidget(self.memory_check)
+        button_layout.addStretch()
+        button_layout.addWidget(self.clear_button)
+        layout.addLayout(button_layout)
+
+        self.setWidget(widget)
+        self.recorded.connect(self.add_record)
+
+    def add_record(self, entry):
+        values = (
+            entry['stage'] + (' (failed)' if entry['failed'] else ''),
+            f"{entry['seconds'] * 1000:.1f}",
+            '' if entry['rows'] is None else f"{entry['rows']:,}",
+            '' if entry['peak_bytes'] is None else f"{entry['peak_bytes'] / 2**20:.1f}",
+        )
+        self.table.insertRow(0)
+        for column, value in enumerate(values):
+            item = QTableWidgetItem(value)
+            if column:
+                item.setTextAlignment(Qt.AlignRight | Qt.AlignVCenter)
+            self.table.setItem(0, column, item)
+        if self.table.rowCount() > MAX_ROWS:
+            self.table.removeRow(MAX_ROWS)
+
+    def clear(self):
+        self.table.setRowCount(0)
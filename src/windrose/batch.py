@@ -0,0 +1,230 @@
+"""Headless batch rendering: python batch.py jobs.json
+
+The job spec is a JSON object with optional "defaults" and a list of "jobs".
+Every job names a "file" (or a glob in "files") and may override any default:
+
+    {
+        "defaults": {
+            "date_time_col": "Date & Time",
+            "wind_speed_col": "Wind Speed",
+            "wind_dir_col": "Wind Direction",
+            "date_format": "yyyy-MM-dd HH:mm:ss",
+            "first_row": 0,
+            "last_row": 0,
+            "dir_bins": 16,
+            "speed_ranges": [[2, 4.9], [5, 6.9], [7, 9.9], [10, 14.9], [15, 19.9], [20, 100]],
+            "windows": [{"start": "2023-01-01", "end": "2023-12-31 23:59:59"}],
+            "outputs": ["png", "xlsx", "xml"],
+            "output_dir": "output"
+        },
+        "jobs": [{"file": "station_01.xlsx"}, {"files": "stations/*.xlsx", "dir_bins": 36}]
+    }
+
+Without "windows" each file is rendered over its full date range. Outputs are
+the same PNG, Excel table and XML files the GUI exports produce. "groups" may
+list any of "month", "season" and "hour" to also write the grouped roses
+(small-multiples PNG, one sheet per group, one XML per group). "intervals"
+adds bootstrap confidence bounds to the Excel table and XML, e.g.
+{"method": "block", "replicates": 2000, "confidence": 0.95, "block_hours": 24};
+"method" is "bootstrap" (independent rows) or "block" (whole blocks of time).
+"unbinned": true adds the share of rows in no speed range or sector to the
+tables (a Total column and an Unbinned row) and XML (Velocity_Band_Minimums
+and Unbinned_Probability).
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import pandas as pd
+
+from .binning import HOUR
+from .cache import ColumnCache
+from .export import (frequency_table, write_group_tables, write_group_xml, write_table,
+                     write_xml)
+from .grouped import GROUPINGS, GroupedCounts
+from .pipeline import count_columns, feed_columns, load_records
+from .profiling import enable_from_env
+from .uncertainty import (DEFAULT_BLOCK, DEFAULT_CONFIDENCE, DEFAULT_REPLICATES, METHODS,
+                          BlockCounts, confidence_intervals)
+
+DEFAULTS = {
+    'date_time_col': 'Date & Time',
+    'wind_speed_col': 'Wind Speed',
+    'wind_dir_col': 'Wind Direction',
+    'date_format': 'yyyy-MM-dd HH:mm:ss',
+    'first_row': 0,
+    'last_row': 0,
+    'dir_bins': 16,
+    'speed_ranges': [[2, 4.9], [5, 6.9], [7, 9.9], [10, 14.9], [15, 19.9], [20, 100]],
+    'windows': None,
+    'groups': [],
+    'outputs': ['png', 'xlsx', 'xml'],
+    'output_dir': 'output',
+    'name': None,
+    'intervals': None,
+    'unbinned': False,
+}
+OUTPUTS = ('png', 'xlsx', 'xml')
+
+
+def expand_jobs(spec, base_dir='.'):
+    # One task per input file with every setting resolved
+    defaults = dict(DEFAULTS, **spec.get('defaults', {}))
+    tasks = []
+    for job in spec.get('jobs', []):
+        settings = dict(defaults, **job)
+        if 'file' in job:
+            files = [job['file']]
+        elif 'files' in job:
+            pattern = job['files']
+            files = sorted(glob.glob(os.path.join(base_dir, pattern)))
+            if not files:
+                raise ValueError(f"No files match '{pattern}'")
+        else:
+            raise ValueError("Every job needs a 'file' or 'files' entry")
+        for path in files:
+            task = dict(settings, file=os.path.join(base_dir, path))
+            task.pop('files', None)
+            unknown = set(task['outputs']) - set(OUTPUTS)
+            if unknown:
+                raise ValueError(f"Unknown output types: {', '.join(sorted(unknown))}")
+            unknown = set(task['groups']) - set(GROUPINGS)
+            if unknown:
+                raise ValueError(f"Unknown groupings: {', '.join(sorted(unknown))}")
+            if task['intervals'] is not None and \
+                    task['intervals'].get('method', 'block') not in METHODS:
+                raise ValueError(f"Unknown interval method '{task['intervals']['method']}'")
+            if task['name'] is None or len(files) > 1:
+                task['name'] = os.path.splitext(os.path.basename(path))[0]
+            task['output_dir'] = os.path.join(base_dir, task['output_dir'])
+            tasks.append(task)
+    return tasks
+
+
+def to_ns(value):
+    return int(pd.Timestamp(value).value)
+
+
+def format_time(ns, fmt='%Y-%m-%d %H:%M'):
+    return pd.Timestamp(ns).strftime(fmt)
+
+
+def render_png(result, source, start_text, end_text, file_path):
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from matplotlib.figure import Figure
+
+    from .render import draw_grouped, draw_rose
+
+    grouped = isinstance(result, GroupedCounts)
+    figure = Figure(figsize=(12, 9) if grouped else (8, 8))
+    FigureCanvasAgg(figure)
+    draw = draw_grouped if grouped else draw_rose
+    draw(figure, result, source, start_text, end_text)
+    figure.savefig(file_path, dpi=300, bbox_inches='tight')
+
+
+def window_intervals(records, task, speed_ranges, start, end):
+    # Runs inside a worker process already, so resampling stays on one thread
+    spec = task['intervals']
+    block = int(spec.get('block_hours', DEFAULT_BLOCK / HOUR) * HOUR)
+    counts = feed_columns(BlockCounts(speed_ranges, task['dir_bins'], start, end, block),
+                          *records.columns)
+    return confidence_intervals(counts, spec.get('method', 'block'),
+                                spec.get('replicates', DEFAULT_REPLICATES),
+                                spec.get('confidence', DEFAULT_CONFIDENCE),
+                                spec.get('seed', 0), workers=1)
+
+
+def run_task(task, use_cache=True):
+    # Runs in a worker process: parse the file once, then bin and write every window
+    enable_from_env()
+    cache = ColumnCache() if use_cache else None
+    columns = {key: task[key] for key in ('date_time_col', 'wind_speed_col',
+                                          'wind_dir_col', 'date_format')}
+    records = load_records(cache, task['file'], columns,
+                           first_row=task['first_row'], last_row=task['last_row'])
+    # floats like the GUI's spin boxes, so labels and bands are formatted the same
+    speed_ranges = [(float(low), float(high)) for low, high in task['speed_ranges']]
+
+    windows = task['windows']
+    if not windows:
+        span = records.time_range()
+        if span is None:
+            raise ValueError(f"No valid timestamps in {task['file']}")
+        windows = [{'start': span[0], 'end': span[1], 'label': None}]
+    os.makedirs(task['output_dir'], exist_ok=True)
+    written = []
+    for window in windows:
+        start, end = to_ns(window['start']), to_ns(window['end'])
+        result = count_columns(*records.columns, speed_ranges, task['dir_bins'], start, end)
+        label = window.get('label', f"{format_time(start, '%Y%m%d%H%M')}-"
+                                    f"{format_time(end, '%Y%m%d%H%M')}")
+        stem = task['name'] if label is None else f"{task['name']}_{label}"
+        stem = os.path.join(task['output_dir'], stem)
+        if 'png' in task['outputs']:
+            render_png(result, task['file'], format_time(start), format_time(end), stem + '.png')
+            written.append(stem + '.png')
+        if 'xlsx' in task['outputs'] or 'xml' in task['outputs']:
+            freq_table = frequency_table(result, task['unbinned'])
+            intervals = None if task['intervals'] is None else \
+                window_intervals(records, task, speed_ranges, start, end)
+            if 'xlsx' in task['outputs']:
+                write_table(freq_table, stem + '.xlsx', intervals)
+                written.append(stem + '.xlsx')
+            if 'xml' in task['outputs']:
+                write_xml(freq_table, speed_ranges, stem + '.xml', intervals)
+                written.append(stem + '.xml')
+        for grouping in task['groups']:
+            grouped = feed_columns(GroupedCounts(grouping, speed_ranges, task['dir_bins'],
+                                                 start, end),
+                                   *records.columns)
+            group_stem = f"{stem}_{grouping}"
+            if 'png' in task['outputs']:
+                render_png(grouped, task['file'], format_time(start), format_time(end),
+                           group_stem + '.png')
+                written.append(group_stem + '.png')
+            if 'xlsx' in task['outputs']:
+                write_group_tables(grouped, group_stem + '.xlsx', task['unbinned'])
+                written.append(group_stem + '.xlsx')
+            if 'xml' in task['outputs']:
+                written.extend(write_group_xml(grouped, group_stem + '.xml', task['unbinned']))
+    return written
+
+
+def run(tasks, workers=None, use_cache=True):
+    # Returns the number of failed tasks
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_task, task, use_cache): task for task in tasks}
+        for future in as_completed(futures):
+            task = futures[future]
+            try:
+                written = future.result()
+            except Exception as e:
+                failures += 1
+                print(f"FAILED {task['file']}: {e}", file=sys.stderr)
+            else:
+                print(f"{task['file']}: wrote {len(written)} file(s)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render wind roses for many files without the GUI.")
+    parser.add_argument('spec', help="JSON job spec")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="worker processes (default: one per CPU)")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="do not read or write the parsed-column cache")
+    args = parser.parse_args(argv)
+
+    with open(args.spec) as f:
+        spec = json.load(f)
+    try:
+        tasks = expand_jobs(spec, os.path.dirname(os.path.abspath(args.spec)))
+    except ValueError as e:
+        parser.error(str(e))
+    failures = run(tasks, args.workers, not args.no_cache)
+    return 1 if failures else 0
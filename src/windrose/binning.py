@@ -0,0 +1,152 @@
+import numpy as np
+
+BLOCK_ROWS = 1 << 16
+# int64 nanosecond timestamps: the missing value and the usual spans
+NAT = np.iinfo(np.int64).min
+HOUR = 3600 * 10**9
+DAY = 24 * HOUR
+
+
+def direction_edges(n_dir):
+    return np.linspace(0, 360, n_dir + 1)
+
+
+def direction_centers(n_dir):
+    edges = direction_edges(n_dir)
+    return edges[:-1] + np.diff(edges) / 2
+
+
+def _as_float(values):
+    values = np.asarray(values)
+    if values.dtype not in (np.float32, np.float64):
+        values = values.astype(np.float64)
+    return values
+
+
+def speed_index(speed, speed_ranges):
+    # Index into speed_ranges for every row, -1 where the speed falls in no range.
+    # Ranges are inclusive at both ends; where they overlap a speed is assigned to
+    # the last range whose minimum it reaches. Thresholds are compared in the
+    # data's own precision so float32 columns bin like the spin box values.
+    speed = _as_float(speed)
+    mins = np.array([r[0] for r in speed_ranges], dtype=speed.dtype)
+    maxs = np.array([r[1] for r in speed_ranges], dtype=speed.dtype)
+    order = np.argsort(mins, kind='stable')
+    mins, maxs = mins[order], maxs[order]
+
+    # digitize against the few sorted minimums with one comparison per range
+    pos = np.full(speed.shape, -1, dtype=np.int8)
+    for threshold in mins:
+        pos += speed >= threshold
+    if np.all(maxs[:-1] < mins[1:]):
+        # without overlaps a speed is inside range i exactly when it exceeds the
+        # maximum of every range before it and no other, which avoids a gather
+        above = np.zeros(speed.shape, dtype=np.int8)
+        for threshold in maxs:
+            above += speed > threshold
+        inside = pos == above
+    else:
+        inside = (pos >= 0) & (speed <= maxs[np.maximum(pos, 0)])
+    if np.any(order != np.arange(len(order))):
+        pos = order.astype(np.int8)[pos]
+    return np.where(inside, pos, -1)
+
+
+def direction_index(direction, n_dir):
+    # Index of the direction bin for every row, -1 outside [0, 360]. Bins are
+    # half-open except the last, which includes 360 (same as np.histogram).
+    direction = _as_float(direction)
+    edges = direction_edges(n_dir).astype(direction.dtype)
+    inside = (direction >= 0) & (direction <= 360)
+    scaled = np.where(inside, direction, 0) * direction.dtype.type(n_dir / 360)
+    idx = np.minimum(scaled.astype(np.int16), n_dir - 1)
+    # the multiply can round across an edge, so correct against the real edges
+    idx -= direction < edges[idx]
+    idx += (direction >= edges[idx + 1]) & (idx < n_dir - 1)
+    return np.where(inside, idx, -1)
+
+
+def bin_index(speed, direction, speed_ranges, n_dir):
+    # Flat speed x direction index for every row, -1 where the row falls in no bin.
+    speed_idx = speed_index(speed, speed_ranges)
+    dir_idx = direction_index(direction, n_dir)
+    flat = speed_idx * np.int16(n_dir) + dir_idx
+    return np.where((speed_idx >= 0) & (dir_idx >= 0), flat, -1)
+
+
+def count_matrix(speed, direction, speed_ranges, n_dir, block_rows=BLOCK_ROWS):
+    # Returns the (speed range x direction bin) count matrix and the number of rows
+    # considered, which is the denominator for frequencies. Rows are processed in
+    # blocks so the temporaries stay in cache.
+    speed = np.asarray(speed)
+    direction = np.asarray(direction)
+    size = len(speed_ranges) * n_dir
+    counts = np.zeros(size + 1, dtype=np.int64)
+    for start in range(0, len(speed), block_rows):
+        flat = bin_index(speed[start:start + block_rows],
+                         direction[start:start + block_rows], speed_ranges, n_dir)
+        # shift by one so unbinned rows land in slot 0 instead of needing a mask
+        counts += np.bincount(flat + 1, minlength=size + 1)
+    return counts[1:].reshape(len(speed_ranges), n_dir), len(speed)
+
+
+def window_mask(timestamps, start=None, end=None):
+    # Rows with start <= timestamp <= end; either bound may be None, and with
+    # neither there is nothing to select, so None is returned
+    if start is None and end is None:
+        return None
+    mask = np.ones(len(timestamps), dtype=bool)
+    if start is not None:
+        mask &= timestamps >= start
+    if end is not None:
+        mask &= timestamps <= end
+    return mask
+
+
+def to_percent(counts, total):
+    if total == 0:
+        return np.zeros(counts.shape)
+    return counts / total * 100
+
+
+class CountAccumulator:
+    # Running count matrix fed one chunk at a time, so a rose can be built over
+    # data that never has to be in memory all at once. start and end are optional
+    # inclusive bounds in int64 nanoseconds.
+
+    def __init__(self, speed_ranges, n_dir, start=None, end=None):
+        self.speed_ranges = list(speed_ranges)
+        self.n_dir = n_dir
+        self.start = start
+        self.end = end
+        self.counts = np.zeros((len(self.speed_ranges), n_dir), dtype=np.int64)
+        self.total = 0
+        self.speed_sum = 0.0
+        self.speed_count = 0
+        self.first_time = None
+        self.last_time = None
+
+    def add(self, timestamps, speed, direction):
+        timestamps = np.asarray(timestamps)
+        speed = np.asarray(speed)
+        direction = np.asarray(direction)
+        mask = window_mask(timestamps, self.start, self.end)
+        if mask is not None:
+            timestamps, speed, direction = timestamps[mask], speed[mask], direction[mask]
+        counts, total = count_matrix(speed, direction, self.speed_ranges, self.n_dir)
+        self.counts += counts
+        self.total += total
+        finite = np.isfinite(speed)
+        self.speed_sum += float(speed[finite].sum(dtype=np.float64))
+        self.speed_count += int(finite.sum())
+        valid = timestamps[timestamps != NAT]
+        if len(valid):
+            low, high = int(valid.min()), int(valid.max())
+            self.first_time = low if self.first_time is None else min(self.first_time, low)
+            self.last_time = high if self.last_time is None else max(self.last_time, high)
+
+    @property
+    def mean_speed(self):
+        if self.speed_count == 0:
+            return float('nan')
+        return self.speed_sum / self.speed_count
@@ -0,0 +1,160 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+CACHE_VERSION = 2
+COLUMN_NAMES = ('timestamps', 'speed', 'direction')
+META_NAME = 'meta.json'
+# Least recently used entries are deleted once the cache outgrows this; set
+# WINDROSE_CACHE_MAX_MB to change it
+DEFAULT_MAX_BYTES = 2 * 2**30
+
+
+def default_max_bytes():
+    limit = os.environ.get('WINDROSE_CACHE_MAX_MB')
+    try:
+        return int(float(limit) * 2**20) if limit else DEFAULT_MAX_BYTES
+    except ValueError:
+        return DEFAULT_MAX_BYTES
+
+
+def entry_size(entry):
+    total = 0
+    for name in os.listdir(entry):
+        total += os.path.getsize(os.path.join(entry, name))
+    return total
+
+
+def default_cache_dir():
+    root = os.environ.get('WINDROSE_CACHE_DIR')
+    if root:
+        return root
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.path.join(base, 'windrose-generator')
+
+
+class ColumnCache:
+    # On-disk cache of parsed columns, one directory of .npy files per entry so
+    # hits can be memory-mapped instead of read into RAM. Entries are keyed on the
+    # source file's path, size and mtime plus the settings used to parse it, so an
+    # edited file or a different column/date-format setting is a miss. Storing
+    # an entry deletes the entries of older versions of the same file, and the
+    # entries of row windows once the whole file is stored with the same
+    # settings; past max_bytes the least recently used entries go too.
+
+    def __init__(self, root=None, max_bytes=None):
+        self.root = root or default_cache_dir()
+        self.max_bytes = default_max_bytes() if max_bytes is None else max_bytes
+
+    def key(self, path, settings):
+        stat = os.stat(path)
+        ident = {
+            'version': CACHE_VERSION,
+            'path': os.path.abspath(path),
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'settings': settings,
+        }
+        blob = json.dumps(ident, sort_keys=True).encode('utf-8')
+        return hashlib.sha1(blob).hexdigest()
+
+    def entry_dir(self, path, settings):
+        return os.path.join(self.root, self.key(path, settings))
+
+    def load(self, path, settings):
+        entry = self.entry_dir(path, settings)
+        try:
+            columns = tuple(np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+                            for name in COLUMN_NAMES)
+        except (OSError, ValueError):
+            return None
+        try:
+            # the metadata file's mtime is the entry's last use
+            os.utime(os.path.join(entry, META_NAME))
+        except OSError:
+            pass
+        return columns
+
+    def store(self, path, settings, columns):
+        entry = self.entry_dir(path, settings)
+        os.makedirs(self.root, exist_ok=True)
+        # write into a scratch directory and rename it so readers never see a
+        # partially written entry
+        scratch = tempfile.mkdtemp(dir=self.root, prefix='.tmp-')
+        try:
+            for name, values in zip(COLUMN_NAMES, columns):
+                np.save(os.path.join(scratch, f'{name}.npy'), values)
+            stat = os.stat(path)
+            with open(os.path.join(scratch, META_NAME), 'w') as f:
+                json.dump({'source': os.path.abspath(path), 'size': stat.st_size,
+                           'mtime_ns': stat.st_mtime_ns, 'settings': settings,
+                           'rows': len(columns[0])}, f)
+            try:
+                os.replace(scratch, entry)
+            except OSError:
+                # another process stored the same entry first
+                shutil.rmtree(scratch, ignore_errors=True)
+        except OSError:
+            shutil.rmtree(scratch, ignore_errors=True)
+            return columns
+        self.prune(path, settings, entry)
+        return self.load(path, settings) or columns
+
+    def entries(self):
+        # (entry directory, metadata) of every stored entry; scratch directories
+        # and the watch-mode snapshots kept under the same root are left alone
+        try:
+            names = os.listdir(self.root)
+        except OSError:
+            return
+        for name in names:
+            if name.startswith('.'):
+                continue
+            entry = os.path.join(self.root, name)
+            try:
+                with open(os.path.join(entry, META_NAME)) as f:
+                    yield entry, json.load(f)
+            except (OSError, ValueError):
+                continue
+
+    def prune(self, path, settings, kept):
+        # Deletes the entries superseded by the one just stored at kept, then
+        # the least recently used until the cache fits max_bytes
+        source = os.path.abspath(path)
+        stat = os.stat(path)
+        whole = settings.get('rows') == [0, 0]
+        parse_settings = json.dumps({k: v for k, v in settings.items() if k != 'rows'},
+                                    sort_keys=True)
+        remaining = []
+        for entry, meta in self.entries():
+            if entry == kept:
+                continue
+            if meta.get('source') == source:
+                stale = (meta.get('size'), meta.get('mtime_ns')) != \
+                    (stat.st_size, stat.st_mtime_ns)
+                entry_settings = dict(meta.get('settings') or {})
+                entry_settings.pop('rows', None)
+                window = whole and json.dumps(entry_settings, sort_keys=True) == parse_settings
+                if stale or window:
+                    shutil.rmtree(entry, ignore_errors=True)
+                    continue
+            remaining.append(entry)
+        try:
+            sizes = {entry: entry_size(entry) for entry in remaining + [kept]}
+            used = {entry: os.path.getmtime(os.path.join(entry, META_NAME))
+                    for entry in remaining}
+        except OSError:
+            return
+        total = sum(sizes.values())
+        for entry in sorted(remaining, key=used.get):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(entry, ignore_errors=True)
+            total -= sizes[entry]
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
@@ -0,0 +1,142 @@
+import os
+import re
+import xml.etree.ElementTree as ET
+
+import pandas as pd
+
+from .binning import HOUR, direction_edges, to_percent
+
+# Rows of the window that fall in no speed range or direction bin (calms below
+# the first minimum, gaps between ranges, missing values) still count towards
+# the frequencies; on request the table and XML report their share separately
+UNBINNED_LABEL = 'Unbinned'
+TOTAL_LABEL = 'Total'
+
+
+def frequency_table(result, unbinned=False):
+    # Speed range x direction frequencies in percent of all rows in the window.
+    # unbinned adds a Total column and an Unbinned row so the Total column sums
+    # to 100.
+    speed_labels = [f'{min_val}-{max_val}' if max_val < 100 else f'{min_val}+'
+                    for min_val, max_val in result.speed_ranges]
+    dir_labels = [f"{i:.1f}" for i in direction_edges(result.n_dir)[:-1]]
+    index = pd.Index(speed_labels, name='speed_bin')
+    columns = pd.Index(dir_labels, name='dir_bin')
+    freq_table = pd.DataFrame(to_percent(result.counts, result.total), index=index,
+                              columns=columns)
+    if not unbinned:
+        return freq_table
+    freq_table[TOTAL_LABEL] = freq_table.sum(axis=1)
+    unbinned = result.total - int(result.counts.sum())
+    freq_table.loc[UNBINNED_LABEL, TOTAL_LABEL] = \
+        unbinned / result.total * 100 if result.total else 0.0
+    return freq_table
+
+
+def has_unbinned(freq_table):
+    return UNBINNED_LABEL in freq_table.index
+
+
+def rose_frequencies(freq_table):
+    # The speed range x direction part of a frequency table
+    if not has_unbinned(freq_table):
+        return freq_table
+    return freq_table.drop(index=UNBINNED_LABEL, columns=TOTAL_LABEL)
+
+
+def unbinned_percent(freq_table):
+    return float(freq_table.loc[UNBINNED_LABEL, TOTAL_LABEL])
+
+
+def interval_tables(intervals, freq_table):
+    # The lower and upper bounds laid out like the speed range x direction part
+    # of the frequency table
+    rose = rose_frequencies(freq_table)
+    return tuple(pd.DataFrame(bounds, index=rose.index, columns=rose.columns)
+                 for bounds in (intervals.lower, intervals.upper))
+
+
+def interval_label(intervals):
+    return f"{intervals.confidence * 100:g}%"
+
+
+def write_table(freq_table, file_path, intervals=None):
+    # With intervals the bounds follow on their own sheets
+    if intervals is None:
+        freq_table.to_excel(file_path)
+        return
+    lower, upper = interval_tables(intervals, freq_table)
+    label = interval_label(intervals)
+    with pd.ExcelWriter(file_path) as writer:
+        freq_table.to_excel(writer, sheet_name='Frequency')
+        lower.to_excel(writer, sheet_name=f'Lower {label}')
+        upper.to_excel(writer, sheet_name=f'Upper {label}')
+
+
+def heading_probabilities(parent, tag, freq_table):
+    headings_probabilities = ET.SubElement(parent, tag)
+    for column in freq_table.columns:
+        heading_prob = ET.SubElement(headings_probabilities, "Heading_Probabilities")
+        heading_prob.text = " ".join(f"{val/100:.4f}" for val in freq_table[column])
+
+
+def xml_tree(freq_table, speed_ranges, intervals=None):
+    # Velocity_Bands holds the upper edge of each range. A table with an Unbinned
+    # row also adds Velocity_Band_Minimums, the lower edges, and
+    # Unbinned_Probability, the share of rows in no band or sector, so it and
+    # all heading probabilities add up to 1.
+    unbinned = has_unbinned(freq_table)
+    root = ET.Element("Data")
+    ET.SubElement(root, "Information").text = "Wind Rose Data"
+    ET.SubElement(root, "Name").text = "WindRose"
+    velocity_bands = " ".join(str(max_speed) for _, max_speed in speed_ranges)
+    ET.SubElement(root, "Velocity_Bands").text = velocity_bands
+    if unbinned:
+        band_minimums = " ".join(str(min_speed) for min_speed, _ in speed_ranges)
+        ET.SubElement(root, "Velocity_Band_Minimums").text = band_minimums
+    heading_probabilities(root, "Headings_Probabilities", rose_frequencies(freq_table))
+    if unbinned:
+        ET.SubElement(root, "Unbinned_Probability").text = \
+            f"{unbinned_percent(freq_table)/100:.4f}"
+    if intervals is not None:
+        # the bounds in the same layout as Headings_Probabilities
+        bounds = ET.SubElement(root, "Confidence_Intervals")
+        ET.SubElement(bounds, "Method").text = intervals.method
+        ET.SubElement(bounds, "Confidence").text = f"{intervals.confidence:g}"
+        ET.SubElement(bounds, "Replicates").text = str(intervals.replicates)
+        if intervals.block is not None:
+            ET.SubElement(bounds, "Block_Hours").text = f"{intervals.block / HOUR:g}"
+        lower, upper = interval_tables(intervals, freq_table)
+        heading_probabilities(bounds, "Lower_Headings_Probabilities", lower)
+        heading_probabilities(bounds, "Upper_Headings_Probabilities", upper)
+    return ET.ElementTree(root)
+
+
+def write_xml(freq_table, speed_ranges, file_path, intervals=None):
+    tree = xml_tree(freq_table, speed_ranges, intervals)
+    tree.write(file_path, xml_declaration=True, encoding='utf-8', method="xml")
+
+
+def safe_label(label):
+    # Usable as a sheet name (at most 31 characters, none of []:*?/\) and in a
+    # file name
+    return re.sub(r'[\[\]:*?/\\]', '', label)[:31]
+
+
+def write_group_tables(grouped, file_path, unbinned=False):
+    # One sheet per time group, each laid out like the single-rose table
+    with pd.ExcelWriter(file_path) as writer:
+        for label, result in grouped.groups():
+            frequency_table(result, unbinned).to_excel(writer, sheet_name=safe_label(label))
+
+
+def write_group_xml(grouped, file_path, unbinned=False):
+    # One XML file per group in the export_XML schema, named <stem>_<group>.xml.
+    # Returns the paths written.
+    stem, ext = os.path.splitext(file_path)
+    written = []
+    for label, result in grouped.groups():
+        group_path = f"{stem}_{safe_label(label)}{ext or '.xml'}"
+        write_xml(frequency_table(result, unbinned), result.speed_ranges, group_path)
+        written.append(group_path)
+    return written
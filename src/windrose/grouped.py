@@ -0,0 +1,82 @@
+import numpy as np
+
+from .binning import HOUR, NAT, CountAccumulator, bin_index, window_mask
+
+MONTH_LABELS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+                'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+SEASON_LABELS = ('DJF', 'MAM', 'JJA', 'SON')
+SEASON_OF_MONTH = np.array([0, 0, 1, 1, 1, 2, 2, 2, 3, 3, 3, 0])
+GROUPINGS = {
+    'month': MONTH_LABELS,
+    'season': SEASON_LABELS,
+    'hour': tuple(f'{hour:02d}:00' for hour in range(24)),
+}
+
+
+def group_index(timestamps, grouping):
+    # Group number for every int64 nanosecond timestamp, -1 for NaT
+    timestamps = np.asarray(timestamps)
+    if grouping == 'hour':
+        groups = (timestamps // HOUR) % 24
+    else:
+        months = timestamps.view('datetime64[ns]').astype('datetime64[M]').astype(np.int64) % 12
+        groups = months if grouping == 'month' else SEASON_OF_MONTH[months]
+    return np.where(timestamps == NAT, -1, groups)
+
+
+class GroupedCounts:
+    # Time group x speed x direction counts built in one pass per chunk: each
+    # row's group and bin are folded into a single index for one bincount.
+    # Chunks can come from loaded arrays or a stream, like CountAccumulator.
+    # Groupings other than the time ones in GROUPINGS (such as stations) pass
+    # their labels here and every row's group number to add.
+
+    def __init__(self, grouping, speed_ranges, n_dir, start=None, end=None, labels=None):
+        if labels is None and grouping not in GROUPINGS:
+            raise ValueError(f"Unknown grouping '{grouping}'")
+        self.grouping = grouping
+        self.labels = tuple(labels) if labels is not None else GROUPINGS[grouping]
+        self.speed_ranges = list(speed_ranges)
+        self.n_dir = n_dir
+        self.start = start
+        self.end = end
+        n_groups = len(self.labels)
+        self.size = len(self.speed_ranges) * n_dir
+        self.counts = np.zeros((n_groups, self.size), dtype=np.int64)
+        self.totals = np.zeros(n_groups, dtype=np.int64)
+        self.speed_sums = np.zeros(n_groups)
+        self.speed_counts = np.zeros(n_groups, dtype=np.int64)
+
+    def add(self, timestamps, speed, direction, groups=None):
+        timestamps = np.asarray(timestamps)
+        speed = np.asarray(speed)
+        direction = np.asarray(direction)
+        mask = window_mask(timestamps, self.start, self.end)
+        if mask is not None:
+            timestamps, speed, direction = timestamps[mask], speed[mask], direction[mask]
+            groups = None if groups is None else np.asarray(groups)[mask]
+        groups = group_index(timestamps, self.grouping) if groups is None else \
+            np.asarray(groups, dtype=np.intp)
+        keep = groups >= 0
+        groups, speed, direction = groups[keep], speed[keep], direction[keep]
+        n_groups = len(self.labels)
+        flat = bin_index(speed, direction, self.speed_ranges, self.n_dir) + 1
+        cube = np.bincount(groups * (self.size + 1) + flat, minlength=n_groups * (self.size + 1))
+        self.counts += cube.reshape(n_groups, self.size + 1)[:, 1:]
+        self.totals += np.bincount(groups, minlength=n_groups)
+        finite = np.isfinite(speed)
+        self.speed_sums += np.bincount(groups[finite], weights=speed[finite].astype(np.float64),
+                                       minlength=n_groups)
+        self.speed_counts += np.bincount(groups[finite], minlength=n_groups)
+
+    def group(self, i):
+        # The counts of one group in the form the renderer and exporters take
+        result = CountAccumulator(self.speed_ranges, self.n_dir, self.start, self.end)
+        result.counts = self.counts[i].reshape(len(self.speed_ranges), self.n_dir)
+        result.total = int(self.totals[i])
+        result.speed_sum = float(self.speed_sums[i])
+        result.speed_count = int(self.speed_counts[i])
+        return result
+
+    def groups(self):
+        return [(label, self.group(i)) for i, label in enumerate(self.labels)]
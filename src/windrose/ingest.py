@@ -0,0 +1,77 @@
+import importlib.util
+import os
+
+import numpy as np
+import pandas as pd
+
+from .timestamps import parse_timestamps
+
+TEXT_EXTENSIONS = ('.csv', '.tsv', '.txt')
+# Optional faster readers, used when installed: python-calamine parses
+# workbooks in Rust (pandas >= 2.2) and pyarrow reads CSV on several threads
+FAST_EXCEL_ENGINE = 'calamine'
+FAST_CSV_ENGINE = 'pyarrow'
+
+
+class ColumnNotFoundError(KeyError):
+    pass
+
+
+def delimiter(path):
+    return '\t' if os.path.splitext(path)[1].lower() == '.tsv' else ','
+
+
+def has_module(name):
+    return importlib.util.find_spec(name) is not None
+
+
+def read_table(path, columns=None, first_row=0, last_row=0):
+    # Reads a workbook or CSV/TSV file. With columns, only those are read (and
+    # ColumnNotFoundError raised for any that are missing); first_row/last_row
+    # follow DataConfigWidget, 0-based data rows with last_row 0 meaning the end.
+    ext = os.path.splitext(path)[1].lower()
+    wanted = None if columns is None else set(columns)
+    usecols = None if wanted is None else (lambda name: name in wanted)
+    skiprows = range(1, first_row + 1) if first_row else None
+    nrows = None if last_row == 0 else max(0, last_row - first_row + 1)
+    if ext in TEXT_EXTENSIONS:
+        sep = delimiter(path)
+        dtype = None if columns is None else {columns[0]: str}
+        # the pyarrow engine takes neither row windows nor callable usecols
+        if skiprows is None and nrows is None and has_module(FAST_CSV_ENGINE):
+            if wanted is not None:
+                header = pd.read_csv(path, sep=sep, nrows=0).columns
+                usecols = [col for col in header if col in wanted]
+            table = pd.read_csv(path, sep=sep, usecols=usecols, dtype=dtype,
+                                engine=FAST_CSV_ENGINE)
+        else:
+            table = pd.read_csv(path, sep=sep, usecols=usecols, dtype=dtype,
+                                skiprows=skiprows, nrows=nrows)
+    else:
+        options = dict(usecols=usecols, skiprows=skiprows, nrows=nrows)
+        table = None
+        if has_module('python_calamine'):
+            try:
+                table = pd.read_excel(path, engine=FAST_EXCEL_ENGINE, **options)
+            except (ImportError, ValueError):
+                # pandas too old for the engine or a file it rejects
+                table = None
+        if table is None:
+            table = pd.read_excel(path, **options)
+    for col in columns or ():
+        if col not in table.columns:
+            raise ColumnNotFoundError(col)
+    return table
+
+
+def parse_columns(df, date_time_col, wind_speed_col, wind_dir_col, date_format, layout=None):
+    # Typed columns for the whole sheet: int64 nanosecond timestamps (NaT as the
+    # int64 minimum) and float32 speed and direction. layout is the strftime
+    # layout of the dates when already known, see date_layout.
+    for col in (date_time_col, wind_speed_col, wind_dir_col):
+        if col not in df.columns:
+            raise ColumnNotFoundError(col)
+    timestamps = parse_timestamps(df[date_time_col], date_format, layout)
+    speed = pd.to_numeric(df[wind_speed_col], errors='coerce').to_numpy(dtype=np.float32)
+    direction = pd.to_numeric(df[wind_dir_col], errors='coerce').to_numpy(dtype=np.float32)
+    return timestamps, speed, direction
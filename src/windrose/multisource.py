@@ -0,0 +1,96 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from .binning import NAT
+from .cache import ColumnCache
+from .ingest import TEXT_EXTENSIONS
+from .pipeline import load_records, report
+from .records import WindRecords
+
+DATA_EXTENSIONS = ('.xlsx', '.xls') + TEXT_EXTENSIONS
+# How files are labelled with a station: by file name or by the folder holding them
+STATION_TAGS = ('file', 'folder')
+
+
+def expand_sources(paths):
+    # The data files among paths, with directories searched recursively. Hidden
+    # files and Excel's ~$ lock files are skipped.
+    files = []
+    for path in paths:
+        if not os.path.isdir(path):
+            files.append(path)
+            continue
+        for root, dirs, names in os.walk(path):
+            dirs[:] = sorted(d for d in dirs if not d.startswith('.'))
+            files.extend(os.path.join(root, name) for name in sorted(names)
+                         if not name.startswith(('.', '~$'))
+                         and os.path.splitext(name)[1].lower() in DATA_EXTENSIONS)
+    return files
+
+
+def station_label(path, tag):
+    if tag == 'file':
+        return os.path.splitext(os.path.basename(path))[0]
+    if tag == 'folder':
+        return os.path.basename(os.path.dirname(os.path.abspath(path)))
+    raise ValueError(f"Unknown station tag '{tag}'")
+
+
+def load_one(path, settings, first_row=0, last_row=0, use_cache=True):
+    # Runs in a worker process; returns plain arrays, which pickle compactly
+    cache = ColumnCache() if use_cache else None
+    records = load_records(cache, path, settings, first_row=first_row, last_row=last_row)
+    return tuple(np.asarray(values) for values in records.columns)
+
+
+def merge_records(parts, stations=None, labels=()):
+    # One time-sorted WindRecords from per-file columns. Rows repeating the
+    # timestamp of an earlier row (of the same station, when tagged) are dropped,
+    # so overlapping exports count once; the file listed first wins.
+    timestamps = np.concatenate([part[0] for part in parts])
+    speed = np.concatenate([part[1] for part in parts])
+    direction = np.concatenate([part[2] for part in parts])
+    file_index = np.repeat(np.arange(len(parts)), [len(part[0]) for part in parts])
+    station = np.zeros(len(timestamps), dtype=np.int16) if stations is None else \
+        np.asarray(stations, dtype=np.int16)[file_index]
+    order = np.lexsort((file_index, station, timestamps))
+    timestamps, station = timestamps[order], station[order]
+    keep = np.ones(len(order), dtype=bool)
+    keep[1:] = (timestamps[1:] != timestamps[:-1]) | (station[1:] != station[:-1]) | \
+        (timestamps[1:] == NAT)
+    order = order[keep]
+    return WindRecords(timestamps[keep], speed[order], direction[order],
+                       station[keep] if stations is not None else None, labels)
+
+
+def load_sources(paths, settings, first_row=0, last_row=0, tag=None, workers=None,
+                 use_cache=True, progress=None):
+    # Reads and parses every file in a pool of processes and merges them with
+    # merge_records. With a tag, each row also records its station.
+    labels = ()
+    stations = None
+    if tag is not None:
+        names = [station_label(path, tag) for path in paths]
+        labels = tuple(dict.fromkeys(names))
+        stations = [labels.index(name) for name in names]
+    parts = [None] * len(paths)
+    if len(paths) == 1:
+        report(progress, 0, f'Reading {os.path.basename(paths[0])}')
+        parts[0] = load_one(paths[0], settings, first_row, last_row, use_cache)
+    else:
+        # spawned rather than forked, as the GUI process runs Qt threads
+        pool = ProcessPoolExecutor(max_workers=workers or min(len(paths), os.cpu_count() or 1),
+                                   mp_context=multiprocessing.get_context('spawn'))
+        try:
+            futures = {pool.submit(load_one, path, settings, first_row, last_row, use_cache): i
+                       for i, path in enumerate(paths)}
+            for done, future in enumerate(as_completed(futures), 1):
+                parts[futures[future]] = future.result()
+                report(progress, 90 * done // len(paths), f'Read {done} of {len(paths)} files')
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+    report(progress, 90, 'Merging files')
+    return merge_records(parts, stations, labels)
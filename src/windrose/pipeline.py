@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+
+from .binning import NAT, CountAccumulator
+from .profiling import PROFILER
+
+COUNT_CHUNK_ROWS = 1 << 20
+
+
+def report(progress, percent, message):
+    # progress is an optional callable(percent, message); a worker's callback
+    # raises from here to cancel the job between steps
+    if progress is not None:
+        progress(percent, message)
+
+
+def load_records(cache, path, settings, progress=None, first_row=0, last_row=0):
+    # Rows first_row..last_row of path as WindRecords, reading only the three
+    # configured columns. The whole file is parsed and cached once and every row
+    # window is a view of it, so moving the window reads nothing. The window is
+    # only pushed down to the reader when no cached whole file is at hand, which
+    # keeps a first look at part of a large workbook quick. The table read is
+    # dropped once parsed: its date strings take several times the memory of the
+    # records, and another date format is rare enough to read the file again.
+    # cache may be None.
+    from .records import WindRecords
+
+    rows = [first_row, last_row]
+    whole = [0, 0]
+    with PROFILER.stage('cache load') as stage:
+        columns = None
+        if cache is not None:
+            columns = cache.load(path, dict(settings, rows=whole))
+            if columns is not None:
+                columns = WindRecords(*columns).rows(first_row, last_row).columns
+            elif rows != whole:
+                columns = cache.load(path, dict(settings, rows=rows))
+        stage.rows = 0 if columns is None else len(columns[0])
+    if columns is not None:
+        return WindRecords(*columns)
+    # ingest brings in pandas, which only a cache miss needs
+    from .ingest import parse_columns, read_table
+
+    report(progress, 5, f'Reading {os.path.basename(path)}')
+    with PROFILER.stage('read') as stage:
+        raw_data = read_table(path, column_names(settings), *rows)
+        stage.rows = len(raw_data)
+    report(progress, 60, 'Parsing columns')
+    with PROFILER.stage('parse', len(raw_data)):
+        columns = parse_columns(raw_data, **settings)
+    del raw_data
+    if cache is not None:
+        report(progress, 80, 'Writing cache')
+        columns = cache.store(path, dict(settings, rows=rows), columns)
+    return WindRecords(*columns)
+
+
+def column_names(settings):
+    # The date/time, speed and direction column names of the column settings,
+    # in the order parse_columns returns them
+    return [settings['date_time_col'], settings['wind_speed_col'], settings['wind_dir_col']]
+
+
+def row_slice(first_row, last_row):
+    # first_row/last_row follow DataConfigWidget: 0-based data rows, last_row 0
+    # meaning the end of the file
+    return slice(first_row, None) if last_row == 0 else slice(first_row, last_row + 1)
+
+
+def feed_columns(accumulator, timestamps, speed, direction, progress=None,
+                 chunk_rows=COUNT_CHUNK_ROWS, groups=None):
+    # Feeds the arrays to a CountAccumulator or GroupedCounts chunk by chunk,
+    # reporting progress so the job can be cancelled in between. groups are
+    # passed on to GroupedCounts along with the rows.
+    n_rows = len(timestamps)
+    for first in range(0, n_rows, chunk_rows):
+        report(progress, int(100 * first / n_rows), 'Binning')
+        last = first + chunk_rows
+        chunk = (timestamps[first:last], speed[first:last], direction[first:last])
+        if groups is None:
+            accumulator.add(*chunk)
+        else:
+            accumulator.add(*chunk, groups=groups[first:last])
+    return accumulator
+
+
+def count_columns(timestamps, speed, direction, speed_ranges, n_dir, start=None, end=None,
+                  progress=None, chunk_rows=COUNT_CHUNK_ROWS):
+    accumulator = CountAccumulator(speed_ranges, n_dir, start, end)
+    return feed_columns(accumulator, timestamps, speed, direction, progress, chunk_rows)
+
+
+def timestamp_range(timestamps):
+    valid = np.asarray(timestamps)
+    valid = valid[valid != NAT]
+    if len(valid) == 0:
+        return None
+    return int(valid.min()), int(valid.max())
@@ -0,0 +1,162 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+# Set to a file path to log every stage as a JSON line from startup on
+LOG_ENV = 'WINDROSE_STAGE_LOG'
+MAX_RECORDS = 1000
+
+
+class NullStage:
+    # What stage() hands out while profiling is off: entering and leaving it,
+    # and setting rows on it, do nothing
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+NULL_STAGE = NullStage()
+
+
+class Stage:
+    # One timed run of a pipeline stage; set rows inside the with block once
+    # the number of rows handled is known
+
+    def __init__(self, profiler, name, rows):
+        self.profiler = profiler
+        self.name = name
+        self.rows = rows
+        self.memory = profiler.memory
+        # highest traced memory seen by stages nested in this one, which reset
+        # the peak when they start
+        self.nested_peak = 0
+
+    def __enter__(self):
+        stack = self.profiler.stack()
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if stack:
+                stack[-1].nested_peak = max(stack[-1].nested_peak, peak)
+            tracemalloc.reset_peak()
+            self.memory_start = current
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        seconds = time.perf_counter() - self.start
+        stack = self.profiler.stack()
+        stack.pop()
+        peak = None
+        if self.memory and tracemalloc.is_tracing():
+            absolute = max(tracemalloc.get_traced_memory()[1], self.nested_peak)
+            if stack:
+                stack[-1].nested_peak = max(stack[-1].nested_peak, absolute)
+            peak = max(0, absolute - self.memory_start)
+        self.profiler.record({
+            'stage': self.name,
+            'seconds': seconds,
+            'rows': self.rows,
+            'peak_bytes': peak,
+            'failed': exc_type is not None,
+            'thread': threading.current_thread().name,
+            'time': time.time(),
+        })
+        return False
+
+
+class StageProfiler:
+    # Records wall time, rows handled and peak memory of named pipeline stages:
+    #
+    #     with PROFILER.stage('parse') as stage:
+    #         ...
+    #         stage.rows = len(columns[0])
+    #
+    # Disabled, stage() returns a shared do-nothing object, so instrumented code
+    # costs one call. Peak memory is the most memory traced by tracemalloc
+    # above the level at the start of the stage; tracing slows allocation-heavy
+    # Python code somewhat, so it can be left off. Stages running at the same
+    # time on different threads share tracemalloc's peak, so theirs is
+    # approximate. Records go to the listeners (called on the stage's thread),
+    # a bounded history and, when set, a JSON-lines log.
+
+    def __init__(self):
+        self.enabled = False
+        self.memory = False
+        self.log_path = None
+        self.records = deque(maxlen=MAX_RECORDS)
+        self.listeners = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.started_tracing = False
+
+    def stage(self, name, rows=None):
+        if not self.enabled:
+            return NULL_STAGE
+        return Stage(self, name, rows)
+
+    def stack(self):
+        stack = getattr(self.local, 'stack', None)
+        if stack is None:
+            stack = self.local.stack = []
+        return stack
+
+    def enable(self, memory=True):
+        self.enabled = True
+        self.set_memory(memory)
+
+    def disable(self):
+        self.enabled = False
+        self.set_memory(False)
+
+    def set_memory(self, memory):
+        self.memory = memory and self.enabled
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+        elif not self.memory and self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+
+    def set_log(self, path):
+        # Appends every record to path as a JSON line while enabled; None stops
+        # logging
+        self.log_path = path
+
+    def record(self, entry):
+        with self.lock:
+            self.records.append(entry)
+            if self.log_path is not None:
+                try:
+                    with open(self.log_path, 'a', encoding='utf-8') as f:
+                        f.write(json.dumps(entry) + '\n')
+                except OSError:
+                    self.log_path = None
+            listeners = list(self.listeners)
+        for listener in listeners:
+            listener(entry)
+
+    def clear(self):
+        with self.lock:
+            self.records.clear()
+
+
+PROFILER = StageProfiler()
+
+
+def enable_from_env():
+    # Starts logging to the file named by WINDROSE_STAGE_LOG, if set
+    path = os.environ.get(LOG_ENV)
+    if path:
+        PROFILER.set_log(path)
+        PROFILER.enable(memory=False)
+    return path
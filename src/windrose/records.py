@@ -0,0 +1,53 @@
+import numpy as np
+
+from .pipeline import row_slice, timestamp_range
+
+TIMESTAMP_DTYPE = np.int64
+SPEED_DTYPE = np.float32
+# float32 rather than uint16 so fractional degrees and missing readings (NaN)
+# survive, matching what parse_columns produces
+DIRECTION_DTYPE = np.float32
+STATION_DTYPE = np.int16
+
+
+class WindRecords:
+    # The loaded dataset as three contiguous typed columns: int64 nanosecond
+    # timestamps (NaT as int64 min), float32 speed and float32 direction, 16
+    # bytes a row. Columns that already have the right dtype and layout, such as
+    # memory-mapped cache entries, are used as they are, and row selections are
+    # views of them rather than copies. Data merged from several stations also
+    # has an int16 station index per row into station_labels.
+
+    def __init__(self, timestamps, speed, direction, stations=None, station_labels=()):
+        self.timestamps = np.ascontiguousarray(timestamps, dtype=TIMESTAMP_DTYPE)
+        self.speed = np.ascontiguousarray(speed, dtype=SPEED_DTYPE)
+        self.direction = np.ascontiguousarray(direction, dtype=DIRECTION_DTYPE)
+        self.stations = None if stations is None else \
+            np.ascontiguousarray(stations, dtype=STATION_DTYPE)
+        self.station_labels = tuple(station_labels)
+        if not len(self.timestamps) == len(self.speed) == len(self.direction):
+            raise ValueError("Record columns must have the same length")
+        if self.stations is not None and len(self.stations) != len(self.timestamps):
+            raise ValueError("Record columns must have the same length")
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def columns(self):
+        return self.timestamps, self.speed, self.direction
+
+    @property
+    def nbytes(self):
+        stations = 0 if self.stations is None else self.stations.nbytes
+        return sum(values.nbytes for values in self.columns) + stations
+
+    def rows(self, first_row=0, last_row=0):
+        # first_row/last_row as in DataConfigWidget; the result shares memory
+        rows = row_slice(first_row, last_row)
+        stations = None if self.stations is None else self.stations[rows]
+        return WindRecords(*(values[rows] for values in self.columns), stations,
+                           self.station_labels)
+
+    def time_range(self):
+        return timestamp_range(self.timestamps)
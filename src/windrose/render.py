@@ -0,0 +1,234 @@
+import os
+
+import numpy as np
+from matplotlib import rcParams
+from matplotlib.collections import PolyCollection
+
+from .binning import direction_centers, to_percent
+
+DEFAULT_COLORS = ['blue', 'cyan', 'lightgreen', 'yellow', 'red', 'darkred']
+# Shrink the radial axis once the tallest bar drops below this share of it
+RESCALE_FRACTION = 0.5
+ARC_STEP_DEGREES = 2
+# Grouped roses share a radial scale, except groups with fewer rows than this
+# share of the largest group's, whose few readings can reach high percentages
+SHARED_SCALE_FRACTION = 0.1
+
+
+def speed_label(min_speed, max_speed):
+    return f'{min_speed:.1f}-{max_speed:.1f}' if max_speed < 100 else f'{min_speed:.1f}+'
+
+
+def prevailing_direction(result):
+    dir_centers = direction_centers(result.n_dir)
+    return dir_centers[np.argmax(result.counts.sum(axis=0))]
+
+
+def info_text(result, source, start_text, end_text):
+    filename = os.path.basename(source)
+    return (
+        f"Data Source: {filename}\n"
+        f"Date Range: {start_text} to {end_text}\n"
+        f"Prevailing Wind Direction: {prevailing_direction(result):.1f}°\n"
+        f"Average Wind Speed: {result.mean_speed:.1f} m/s\n"
+    )
+
+
+def bar_polygons(n_dir, bottom, height):
+    # One closed (theta, r) outline per direction bin: the inner arc, then the
+    # outer arc back. Arcs are sampled explicitly because collections are not
+    # interpolated by the polar transform the way single bar patches are.
+    width = 2 * np.pi / n_dir
+    steps = max(2, int(np.ceil(np.degrees(width) / ARC_STEP_DEGREES)) + 1)
+    offsets = np.linspace(-width / 2, width / 2, steps)
+    theta = np.radians(direction_centers(n_dir))[:, None] + offsets
+    inner = np.broadcast_to(np.asarray(bottom, dtype=float)[:, None], theta.shape)
+    outer = inner + np.asarray(height, dtype=float)[:, None]
+    thetas = np.concatenate([theta, theta[:, ::-1]], axis=1)
+    radii = np.concatenate([inner, outer[:, ::-1]], axis=1)
+    return np.stack([thetas, radii], axis=-1)
+
+
+def radial_limit(ax, stacked):
+    # Matches the autoscaled limit of bars: the tallest stack plus the y margin
+    top = float(np.max(stacked)) * (1 + ax.margins()[1]) if len(stacked) else 0.0
+    return top if top > 0 else 1.0
+
+
+def stacked_heights(result):
+    return to_percent(result.counts, result.total).sum(axis=0)
+
+
+def add_stacked_bars(ax, result, colors=DEFAULT_COLORS):
+    # One PolyCollection per speed category, stacked outwards, on a polar axes
+    # oriented like a compass. Returns the collections.
+    n_dir = result.n_dir
+    freqs = to_percent(result.counts, result.total)
+    bottom = np.zeros(n_dir)
+    cycle = rcParams['axes.prop_cycle'].by_key()['color']
+    collections = []
+    for i, (min_speed, max_speed) in enumerate(result.speed_ranges):
+        hist = freqs[i]
+        color = colors[i] if i < len(colors) else cycle[(i - len(colors)) % len(cycle)]
+        bars = PolyCollection(bar_polygons(n_dir, bottom, hist), facecolors=color,
+                              edgecolors='none', label=f'{speed_label(min_speed, max_speed)} m/s')
+        ax.add_collection(bars, autolim=False)
+        collections.append(bars)
+        bottom += hist
+    ax.set_theta_direction(-1)
+    ax.set_theta_zero_location('N')
+    return collections
+
+
+class RoseRenderer:
+    # Builds the rose once and afterwards only reshapes the bars and rewrites the
+    # info text, until the number of direction bins or speed categories changes.
+    # With blit=True (an interactive canvas) the bars and text are animated
+    # artists drawn over a cached background, so a redraw that leaves the radial
+    # scale and legend alone does not re-render the rest of the figure.
+
+    def __init__(self, figure, colors=DEFAULT_COLORS, blit=False):
+        self.figure = figure
+        self.colors = colors
+        self.blit = blit
+        self.ax = None
+        self.bars = []
+        self.text = None
+        self.shape = None
+        self.background = None
+        if blit:
+            figure.canvas.mpl_connect('draw_event', self.on_draw)
+
+    def draw(self, result, source, start_text, end_text):
+        # Returns True when the figure had to be rebuilt
+        shape = (result.n_dir, len(result.speed_ranges))
+        if shape != self.shape or self.ax not in self.figure.axes:
+            self.build(result, source, start_text, end_text)
+            if self.blit:
+                self.figure.canvas.draw()
+            return True
+        if self.update(result, source, start_text, end_text) or self.background is None:
+            if self.blit:
+                self.figure.canvas.draw()
+        elif self.blit:
+            self.figure.canvas.restore_region(self.background)
+            self.draw_animated()
+            self.figure.canvas.blit(self.figure.bbox)
+        return False
+
+    def build(self, result, source, start_text, end_text):
+        figure = self.figure
+        figure.clear()
+        gs = figure.add_gridspec(2, 1, height_ratios=[4, 1])
+        ax = figure.add_subplot(gs[0], projection='polar')
+        n_dir = result.n_dir
+        self.bars = add_stacked_bars(ax, result, self.colors)
+        ax.set_ylim(0, radial_limit(ax, stacked_heights(result)))
+        ax.set_title('Wind Rose Diagram')
+        ax.legend(bbox_to_anchor=(1.2, 0.5), loc='center left')
+        ax_text = figure.add_subplot(gs[1])
+        ax_text.axis('off')
+        self.text = ax_text.text(0.05, 0.95, info_text(result, source, start_text, end_text),
+                                 transform=ax_text.transAxes,
+                                 verticalalignment='top',
+                                 fontfamily='monospace')
+        figure.tight_layout()
+        self.ax = ax
+        self.shape = (n_dir, len(result.speed_ranges))
+        self.background = None
+        for artist in self.animated_artists():
+            artist.set_animated(self.blit)
+
+    def update(self, result, source, start_text, end_text):
+        # Moves the existing artists; returns True if anything outside them
+        # (radial scale or legend) changed and the full figure must be drawn
+        freqs = to_percent(result.counts, result.total)
+        bottom = np.zeros(result.n_dir)
+        for bars, hist in zip(self.bars, freqs):
+            bars.set_verts(bar_polygons(result.n_dir, bottom, hist))
+            bottom = bottom + hist
+        self.text.set_text(info_text(result, source, start_text, end_text))
+
+        changed = False
+        legend_texts = self.ax.get_legend().get_texts()
+        for text, (min_speed, max_speed) in zip(legend_texts, result.speed_ranges):
+            label = f'{speed_label(min_speed, max_speed)} m/s'
+            if text.get_text() != label:
+                text.set_text(label)
+                changed = True
+        # keep the radial scale while the tallest bar still fits and fills at
+        # least half of it, so most redraws can be blitted
+        top_limit = self.ax.get_ylim()[1]
+        needed = radial_limit(self.ax, bottom)
+        if needed > top_limit or needed < top_limit * RESCALE_FRACTION:
+            self.ax.set_ylim(0, needed)
+            changed = True
+        return changed
+
+    def animated_artists(self):
+        artists = list(self.bars)
+        if self.text is not None:
+            artists.append(self.text)
+        return artists
+
+    def draw_animated(self):
+        for artist in self.animated_artists():
+            artist.axes.draw_artist(artist)
+
+    def on_draw(self, event):
+        # A full draw skips animated artists, so grab the new background and
+        # paint them on top. Saving draws them itself.
+        canvas = self.figure.canvas
+        if self.ax not in self.figure.axes or canvas.is_saving():
+            return
+        self.background = canvas.copy_from_bbox(self.figure.bbox)
+        self.draw_animated()
+
+
+def draw_rose(figure, result, source, start_text, end_text, colors=DEFAULT_COLORS):
+    # Draws the rose and its info panel into figure in one go (no blitting).
+    # Returns the polar axes.
+    renderer = RoseRenderer(figure, colors)
+    renderer.draw(result, source, start_text, end_text)
+    return renderer.ax
+
+
+def grid_shape(n_panels):
+    n_cols = {4: 2, 12: 4, 24: 6}.get(n_panels, int(np.ceil(np.sqrt(n_panels))))
+    return int(np.ceil(n_panels / n_cols)), n_cols
+
+
+def draw_grouped(figure, grouped, source, start_text, end_text, colors=DEFAULT_COLORS):
+    # Small multiples, one rose per time group, on the same radial scale so the
+    # panels can be compared directly. Groups much smaller than the largest are
+    # left out of that scale and drawn on their own, so that a handful of
+    # readings at a high percentage cannot flatten every other panel.
+    figure.clear()
+    groups = grouped.groups()
+    n_rows, n_cols = grid_shape(len(groups))
+    largest = max(result.total for _, result in groups)
+    shared = [result.total == 0 or result.total >= largest * SHARED_SCALE_FRACTION
+              for _, result in groups]
+    top = max(float(stacked_heights(result).max())
+              for (_, result), in_scale in zip(groups, shared) if in_scale)
+    axes = []
+    for i, (label, result) in enumerate(groups):
+        ax = figure.add_subplot(n_rows, n_cols, i + 1, projection='polar')
+        add_stacked_bars(ax, result, colors)
+        title = f'{label} ({result.total} obs)'
+        if shared[i]:
+            ax.set_ylim(0, top * (1 + ax.margins()[1]) if top > 0 else 1)
+        else:
+            ax.set_ylim(0, radial_limit(ax, stacked_heights(result)))
+            title = f'{label} ({result.total} obs, own scale)'
+        ax.set_title(title, fontsize='small')
+        ax.tick_params(labelsize='x-small')
+        ax.set_xticks(np.radians([0, 90, 180, 270]), ['N', 'E', 'S', 'W'])
+        axes.append(ax)
+    handles, labels = axes[0].get_legend_handles_labels()
+    figure.legend(handles, labels, loc='lower center', ncol=len(labels), fontsize='small')
+    filename = os.path.basename(source)
+    figure.suptitle(f'Wind Roses by {grouped.grouping.title()} - {filename}\n'
+                    f'{start_text} to {end_text}')
+    figure.tight_layout(rect=(0, 0.05, 1, 0.95))
+    return axes
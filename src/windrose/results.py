@@ -0,0 +1,87 @@
+from collections import OrderedDict
+
+# Count matrices are tiny (speed bins x direction bins), so this holds thousands
+# of windows; derived tables are counted against the same budget
+MAX_RESULT_BYTES = 16 * 1024 * 1024
+ENTRY_OVERHEAD = 512
+
+
+def value_size(value):
+    if hasattr(value, 'memory_usage'):
+        return int(value.memory_usage(deep=True).sum())
+    if hasattr(value, 'counts'):
+        return value.counts.nbytes
+    return getattr(value, 'nbytes', 0)
+
+
+def result_key(fingerprint, window, n_dir, speed_ranges):
+    # fingerprint identifies the dataset (file identity, column settings and row
+    # range); the rest are the binning settings the counts depend on
+    return (fingerprint, tuple(window), n_dir,
+            tuple((float(low), float(high)) for low, high in speed_ranges))
+
+
+class ResultCache:
+    # LRU cache of computed CountAccumulators and values derived from them, such
+    # as frequency tables, so repeat views and exports of the same window skip
+    # the filtering and binning. Least recently used entries are evicted once the
+    # total size passes max_bytes.
+
+    def __init__(self, max_bytes=MAX_RESULT_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.nbytes = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        self.entries.move_to_end(key)
+        return entry['result']
+
+    def put(self, key, result):
+        # a key of None marks a result that cannot be identified, so it is not kept
+        if key is None:
+            return
+        if key in self.entries and self.entries[key]['result'] is result:
+            self.entries.move_to_end(key)
+            return
+        self.discard(key)
+        entry = {'result': result, 'derived': {}, 'nbytes': ENTRY_OVERHEAD + value_size(result)}
+        self.entries[key] = entry
+        self.nbytes += entry['nbytes']
+        self.evict()
+
+    def derived(self, key, name, compute):
+        # compute() once per entry; computed without caching if key is not cached
+        entry = self.entries.get(key)
+        if entry is None:
+            return compute()
+        self.entries.move_to_end(key)
+        if name not in entry['derived']:
+            value = compute()
+            entry['derived'][name] = value
+            size = value_size(value)
+            entry['nbytes'] += size
+            self.nbytes += size
+            self.evict()
+            return value
+        return entry['derived'][name]
+
+    def discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.nbytes -= entry['nbytes']
+
+    def evict(self):
+        # always keeps the newest entry, even if it alone is over budget
+        while self.nbytes > self.max_bytes and len(self.entries) > 1:
+            _, entry = self.entries.popitem(last=False)
+            self.nbytes -= entry['nbytes']
+
+    def clear(self):
+        self.entries.clear()
+        self.nbytes = 0
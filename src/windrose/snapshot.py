@@ -0,0 +1,281 @@
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+from .binning import HOUR, NAT, CountAccumulator, bin_index
+from .cache import default_cache_dir
+from .ingest import TEXT_EXTENSIONS
+from .pipeline import report
+from .streaming import csv_header, iter_csv_tail, iter_excel_frames, parse_chunk
+
+SNAPSHOT_VERSION = 1
+# An hour holds six 10-minute records, and five years of hourly buckets with
+# six speed bins and 16 sectors take about 17 MB
+DEFAULT_BUCKET = HOUR
+ARRAY_NAMES = ('buckets', 'counts', 'totals', 'speed_sums', 'speed_counts',
+               'first_times', 'last_times')
+
+
+class CountSnapshot:
+    # Time bucket x speed x direction counts that can be saved, loaded and
+    # merged, so a growing file only needs its new rows binned. Only buckets that
+    # hold rows are stored, in time order. Rows without a timestamp are kept in
+    # a separate accumulator that only whole-record queries include.
+    #
+    # Queries are resolved to whole buckets: every bucket that overlaps the
+    # window counts in full.
+
+    def __init__(self, speed_ranges, n_dir, bucket=DEFAULT_BUCKET):
+        self.speed_ranges = list(speed_ranges)
+        self.n_dir = n_dir
+        self.bucket = bucket
+        self.size = len(self.speed_ranges) * n_dir
+        self.buckets = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros((0, self.size), dtype=np.int32)
+        self.totals = np.zeros(0, dtype=np.int32)
+        self.speed_sums = np.zeros(0)
+        self.speed_counts = np.zeros(0, dtype=np.int32)
+        self.first_times = np.zeros(0, dtype=np.int64)
+        self.last_times = np.zeros(0, dtype=np.int64)
+        self.undated = CountAccumulator(self.speed_ranges, n_dir)
+        # where reading of the source file stopped, see append_tail
+        self.source = {}
+
+    def like(self):
+        return CountSnapshot(self.speed_ranges, self.n_dir, self.bucket)
+
+    def matches(self, speed_ranges, n_dir):
+        return self.n_dir == n_dir and self.speed_ranges == list(speed_ranges)
+
+    def __len__(self):
+        return int(self.totals.sum()) + self.undated.total
+
+    def add(self, timestamps, speed, direction):
+        timestamps = np.asarray(timestamps)
+        speed = np.asarray(speed)
+        direction = np.asarray(direction)
+        dated = timestamps != NAT
+        if not dated.all():
+            undated = ~dated
+            self.undated.add(timestamps[undated], speed[undated], direction[undated])
+            timestamps, speed, direction = timestamps[dated], speed[dated], direction[dated]
+        if len(timestamps) == 0:
+            return
+        buckets, rows = np.unique(timestamps // self.bucket, return_inverse=True)
+        n_buckets = len(buckets)
+        flat = bin_index(speed, direction, self.speed_ranges, self.n_dir) + 1
+        counts = np.bincount(rows * (self.size + 1) + flat, minlength=n_buckets * (self.size + 1))
+        finite = np.isfinite(speed)
+        first_times = np.full(n_buckets, np.iinfo(np.int64).max)
+        last_times = np.full(n_buckets, NAT)
+        np.minimum.at(first_times, rows, timestamps)
+        np.maximum.at(last_times, rows, timestamps)
+        self.combine(buckets,
+                     counts.reshape(n_buckets, self.size + 1)[:, 1:],
+                     np.bincount(rows, minlength=n_buckets),
+                     np.bincount(rows[finite], weights=speed[finite].astype(np.float64),
+                                 minlength=n_buckets),
+                     np.bincount(rows[finite], minlength=n_buckets),
+                     first_times, last_times)
+
+    def combine(self, buckets, counts, totals, speed_sums, speed_counts, first_times, last_times):
+        # Adds per-bucket arrays for sorted unique bucket numbers into this one,
+        # building new arrays so earlier references see no change
+        if len(self.buckets) and len(buckets) and buckets[0] > self.buckets[-1]:
+            # the usual case of new rows after all the old ones
+            merged = np.concatenate((self.buckets, buckets))
+        else:
+            merged = np.union1d(self.buckets, buckets)
+        old = np.searchsorted(merged, self.buckets)
+        new = np.searchsorted(merged, buckets)
+        arrays = {}
+        for name, values, fill in (('counts', counts, 0), ('totals', totals, 0),
+                                   ('speed_sums', speed_sums, 0),
+                                   ('speed_counts', speed_counts, 0),
+                                   ('first_times', first_times, np.iinfo(np.int64).max),
+                                   ('last_times', last_times, NAT)):
+            current = getattr(self, name)
+            combined = np.full((len(merged),) + current.shape[1:], fill, dtype=current.dtype)
+            combined[old] = current
+            if name == 'first_times':
+                combined[new] = np.minimum(combined[new], values)
+            elif name == 'last_times':
+                combined[new] = np.maximum(combined[new], values)
+            else:
+                combined[new] += values.astype(current.dtype)
+            arrays[name] = combined
+        self.buckets = merged
+        for name, values in arrays.items():
+            setattr(self, name, values)
+
+    def copy(self):
+        # Shares the per-bucket arrays, which are replaced rather than changed in
+        # place, so the copy can be merged into without affecting this one
+        copied = self.like()
+        for name in ARRAY_NAMES:
+            setattr(copied, name, getattr(self, name))
+        for name in ('total', 'speed_sum', 'speed_count'):
+            setattr(copied.undated, name, getattr(self.undated, name))
+        copied.undated.counts = self.undated.counts.copy()
+        copied.source = dict(self.source)
+        return copied
+
+    def merge(self, other):
+        # A new snapshot with the rows of both, e.g. a stored history and the
+        # tail read since. Both must use the same bins and bucket width.
+        if not self.matches(other.speed_ranges, other.n_dir) or self.bucket != other.bucket:
+            raise ValueError("Snapshots with different bins or buckets cannot be merged")
+        merged = self.copy()
+        merged.combine(*(getattr(other, name) for name in ARRAY_NAMES))
+        for name in ('counts', 'total', 'speed_sum', 'speed_count'):
+            setattr(merged.undated, name,
+                    getattr(self.undated, name) + getattr(other.undated, name))
+        return merged
+
+    def time_range(self):
+        if len(self.buckets) == 0:
+            return None
+        return int(self.first_times[0]), int(self.last_times[-1])
+
+    def snap(self, start, end):
+        # The window query(start, end) actually counts: start moved back to the
+        # start of its bucket and end forward to the last nanosecond of its own
+        start -= start % self.bucket
+        end += self.bucket - 1 - end % self.bucket
+        return start, end
+
+    def query(self, start=None, end=None):
+        # Same form as CountAccumulator(start, end) fed with every row, at
+        # bucket resolution; see snap()
+        first = 0 if start is None else int(np.searchsorted(self.buckets, start // self.bucket))
+        last = len(self.buckets) if end is None else \
+            int(np.searchsorted(self.buckets, end // self.bucket, side='right'))
+        last = max(first, last)
+        result = CountAccumulator(self.speed_ranges, self.n_dir, start, end)
+        counts = self.counts[first:last].sum(axis=0, dtype=np.int64)
+        result.counts = counts.reshape(len(self.speed_ranges), self.n_dir)
+        result.total = int(self.totals[first:last].sum(dtype=np.int64))
+        result.speed_sum = float(self.speed_sums[first:last].sum())
+        result.speed_count = int(self.speed_counts[first:last].sum(dtype=np.int64))
+        if last > first:
+            result.first_time = int(self.first_times[first])
+            result.last_time = int(self.last_times[last - 1])
+        if start is None and end is None:
+            result.counts = result.counts + self.undated.counts
+            result.total += self.undated.total
+            result.speed_sum += self.undated.speed_sum
+            result.speed_count += self.undated.speed_count
+        return result
+
+    def save(self, path):
+        meta = {
+            'version': SNAPSHOT_VERSION,
+            'speed_ranges': self.speed_ranges,
+            'n_dir': self.n_dir,
+            'bucket': self.bucket,
+            'undated': {'total': self.undated.total, 'speed_sum': self.undated.speed_sum,
+                        'speed_count': self.undated.speed_count},
+            'source': self.source,
+        }
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        fd, scratch = tempfile.mkstemp(dir=directory, prefix='.tmp-', suffix='.npz')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                # mostly zeros, so compression shrinks it about 40-fold
+                np.savez_compressed(f, meta=np.array(json.dumps(meta)),
+                                    undated=self.undated.counts,
+                                    **{name: getattr(self, name) for name in ARRAY_NAMES})
+            os.replace(scratch, path)
+        except BaseException:
+            if os.path.exists(scratch):
+                os.remove(scratch)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as stored:
+            meta = json.loads(str(stored['meta']))
+            if meta.get('version') != SNAPSHOT_VERSION:
+                raise ValueError(f"Unsupported snapshot version in {path}")
+            snapshot = cls([tuple(r) for r in meta['speed_ranges']], meta['n_dir'], meta['bucket'])
+            for name in ARRAY_NAMES:
+                setattr(snapshot, name, stored[name])
+            snapshot.undated.counts = stored['undated']
+        for name, value in meta['undated'].items():
+            setattr(snapshot.undated, name, value)
+        snapshot.source = meta['source']
+        return snapshot
+
+
+def snapshot_path(path, settings, speed_ranges, n_dir, root=None):
+    # Where the snapshot of a watched file is kept. The key leaves out the file's
+    # size and mtime, which change with every append.
+    ident = {
+        'version': SNAPSHOT_VERSION,
+        'path': os.path.abspath(path),
+        'settings': settings,
+        'speed_ranges': [list(map(float, r)) for r in speed_ranges],
+        'n_dir': n_dir,
+    }
+    key = hashlib.sha1(json.dumps(ident, sort_keys=True).encode('utf-8')).hexdigest()
+    return os.path.join(root or default_cache_dir(), 'snapshots', f'{key}.npz')
+
+
+def load_snapshot(path, settings, speed_ranges, n_dir, root=None):
+    # The stored snapshot for a file and bins, or None
+    try:
+        snapshot = CountSnapshot.load(snapshot_path(path, settings, speed_ranges, n_dir, root))
+    except (OSError, ValueError, KeyError):
+        return None
+    if not snapshot.matches(speed_ranges, n_dir):
+        return None
+    return snapshot
+
+
+def append_tail(snapshot, path, settings, progress=None):
+    # Returns a snapshot that also covers the rows appended to path since
+    # snapshot.source was recorded; snapshot itself is left unchanged. CSV/TSV
+    # files resume at the byte after the last complete line read, workbooks skip
+    # the rows already read. A text file that shrank or has a new header was
+    # replaced rather than appended to, so it is read again from the start.
+    # The date layout decided on the first read is kept in the source and used
+    # for every tail, so a tail of days 1-12 is not read with the other layout.
+    source = snapshot.source
+    text = os.path.splitext(path)[1].lower() in TEXT_EXTENSIONS
+    stat = os.stat(path)
+    header = csv_header(path) if text else None
+    if source.get('path') != os.path.abspath(path) or source.get('settings') != settings or \
+            (text and (stat.st_size < source.get('size', 0) or header != source.get('header'))):
+        snapshot, source = snapshot.like(), {}
+    elif source.get('size') == stat.st_size and source.get('mtime_ns') == stat.st_mtime_ns:
+        return snapshot.copy()
+
+    tail = snapshot.like()
+    layout = source.get('layout')
+    if text:
+        position = source.get('offset', 0)
+        for columns, position, layout in iter_csv_tail(path, settings, position, progress=progress,
+                                                       layout=layout):
+            tail.add(*columns)
+    else:
+        position = source.get('rows', 0)
+        for frame in iter_excel_frames(path, settings, first_row=position, progress=progress):
+            columns, layout = parse_chunk(frame, settings, layout)
+            tail.add(*columns)
+            position += len(columns[0])
+    report(progress, 99, 'Merging counts')
+    merged = snapshot.merge(tail) if len(tail) else snapshot.copy()
+    merged.source = {
+        'path': os.path.abspath(path),
+        'settings': settings,
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'header': header,
+        'offset' if text else 'rows': position,
+        'layout': layout,
+    }
+    return merged
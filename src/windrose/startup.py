@@ -0,0 +1,95 @@
+import builtins
+import importlib.util
+import os
+import sys
+import time
+
+# Set to a non-empty value, or pass --profile-startup to main.py, to print where
+# launch time goes once the window has shown
+PROFILE_ENV = 'WINDROSE_PROFILE_STARTUP'
+PROFILE_FLAG = '--profile-startup'
+REPORT_IMPORTS = 20
+
+
+class StartupProfile:
+    # Times every module imported while enabled, with its own and cumulative
+    # time like python -X importtime, and the phases of startup marked with
+    # mark(). Disabled, mark() returns at once and imports are not wrapped.
+
+    def __init__(self):
+        self.enabled = False
+        self.imports = []
+        self.phases = []
+        self.stack = []
+        self.started = None
+        self.last = None
+        self.original_import = None
+
+    def enable(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        self.started = self.last = time.perf_counter()
+        self.original_import = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            package = (globals or {}).get('__package__') or ''
+            module = importlib.util.resolve_name('.' * level + name, package)
+        else:
+            module = name
+        if module in sys.modules:
+            return self.original_import(name, globals, locals, fromlist, level)
+        # [module, start, time spent in nested imports]
+        frame = [module, time.perf_counter(), 0.0]
+        self.stack.append(frame)
+        try:
+            return self.original_import(name, globals, locals, fromlist, level)
+        finally:
+            self.stack.pop()
+            total = time.perf_counter() - frame[1]
+            if self.stack:
+                self.stack[-1][2] += total
+            self.imports.append((module, total - frame[2], total, len(self.stack)))
+
+    def mark(self, label):
+        # Records the time since the previous mark as the phase label
+        if not self.enabled:
+            return
+        now = time.perf_counter()
+        self.phases.append((label, now - self.last))
+        self.last = now
+
+    def finish(self, file=None):
+        # Stops timing imports and prints the report
+        if not self.enabled:
+            return
+        self.mark('First events')
+        builtins.__import__ = self.original_import
+        self.enabled = False
+        file = file or sys.stderr
+        total = time.perf_counter() - self.started
+        print(f"Startup took {total * 1000:.0f} ms", file=file)
+        print("  Phases:", file=file)
+        for label, seconds in self.phases:
+            print(f"    {label:<32} {seconds * 1000:8.1f} ms", file=file)
+        print(f"  Slowest imports (of {len(self.imports)}), self and cumulative:", file=file)
+        slowest = sorted(self.imports, key=lambda entry: entry[2], reverse=True)
+        for module, own, cumulative, depth in slowest[:REPORT_IMPORTS]:
+            print(f"    {module:<48} {own * 1000:8.1f} {cumulative * 1000:8.1f} ms"
+                  f"{'' if depth else '  (top level)'}", file=file)
+
+
+PROFILE = StartupProfile()
+
+
+def profile_requested(argv=None):
+    # True if startup profiling was asked for; the flag is removed from argv so
+    # Qt does not see it
+    argv = sys.argv if argv is None else argv
+    requested = bool(os.environ.get(PROFILE_ENV))
+    while PROFILE_FLAG in argv:
+        argv.remove(PROFILE_FLAG)
+        requested = True
+    return requested
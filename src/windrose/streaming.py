@@ -0,0 +1,161 @@
+import io
+import itertools
+import os
+
+import pandas as pd
+
+from .binning import CountAccumulator
+from .ingest import TEXT_EXTENSIONS, ColumnNotFoundError, delimiter, parse_columns
+from .pipeline import column_names, report, row_slice
+from .timestamps import date_layout
+
+CHUNK_ROWS = 100_000
+# Bytes read per step when following a growing CSV
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def parse_chunk(chunk, settings, layout=None):
+    # Columns of one chunk and the date layout for the chunks after it: the
+    # first chunk with date strings decides the layout, so a chunk whose dates
+    # happen to fit another layout (only days 1-12, say) is read the same way
+    columns = column_names(settings)
+    if layout is None and columns[0] in chunk.columns:
+        layout = date_layout(chunk[columns[0]], settings['date_format'])
+    return parse_columns(chunk, **settings, layout=layout), layout
+
+
+def iter_csv_chunks(path, settings, first_row=0, last_row=0, chunk_rows=CHUNK_ROWS, progress=None,
+                    layout=None):
+    rows = row_slice(first_row, last_row)
+    start, stop = rows.start, rows.stop
+    columns = column_names(settings)
+    sep = delimiter(path)
+    header = pd.read_csv(path, sep=sep, nrows=0).columns
+    for col in columns:
+        if col not in header:
+            raise ColumnNotFoundError(col)
+    size = max(os.path.getsize(path), 1)
+    with open(path, 'rb') as f:
+        reader = pd.read_csv(f, sep=sep, usecols=columns, dtype={columns[0]: str},
+                             skiprows=range(1, start + 1),
+                             nrows=None if stop is None else stop - start,
+                             chunksize=chunk_rows)
+        with reader:
+            for chunk in reader:
+                # the parser reads ahead, so the file position is only an estimate
+                report(progress, min(99, 100 * f.tell() // size), 'Streaming rows')
+                parsed, layout = parse_chunk(chunk, settings, layout)
+                yield parsed
+
+
+def csv_header(path):
+    # The header line of a CSV/TSV file, or None until it is complete
+    with open(path, 'rb') as f:
+        line = f.readline()
+    if not line.endswith(b'\n'):
+        return None
+    return line.rstrip(b'\r\n').decode('utf-8', errors='replace')
+
+
+def iter_csv_tail(path, settings, offset=0, chunk_bytes=CHUNK_BYTES, progress=None, layout=None):
+    # Parsed columns for the complete lines from byte offset on (the header is
+    # skipped when offset is 0), each with the offset just past its last line
+    # and the date layout used, to pass back in with that offset. A line still
+    # being written is left for the next call.
+    columns = column_names(settings)
+    sep = delimiter(path)
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        if not header_line.endswith(b'\n'):
+            return
+        header = pd.read_csv(io.BytesIO(header_line), sep=sep, nrows=0).columns.tolist()
+        for col in columns:
+            if col not in header:
+                raise ColumnNotFoundError(col)
+        position = max(offset, f.tell())
+        f.seek(position)
+        size = max(os.fstat(f.fileno()).st_size - position, 1)
+        done = 0
+        pending = b''
+        while True:
+            report(progress, min(99, 100 * done // size), 'Reading new rows')
+            block = f.read(chunk_bytes)
+            if not block:
+                break
+            done += len(block)
+            block = pending + block
+            cut = block.rfind(b'\n') + 1
+            block, pending = block[:cut], block[cut:]
+            if not block:
+                continue
+            position += len(block)
+            chunk = pd.read_csv(io.BytesIO(block), sep=sep, header=None, names=header,
+                                usecols=columns, dtype={columns[0]: str})
+            parsed, layout = parse_chunk(chunk, settings, layout)
+            yield parsed, position, layout
+
+
+def iter_excel_chunks(path, settings, first_row=0, last_row=0, chunk_rows=CHUNK_ROWS, progress=None,
+                      layout=None):
+    frames = iter_excel_frames(path, settings, first_row, last_row, chunk_rows, progress)
+    for chunk in frames:
+        parsed, layout = parse_chunk(chunk, settings, layout)
+        yield parsed
+
+
+def iter_excel_frames(path, settings, first_row=0, last_row=0, chunk_rows=CHUNK_ROWS,
+                      progress=None):
+    # The configured columns of the active sheet as unparsed frames
+    from openpyxl import load_workbook
+
+    rows = row_slice(first_row, last_row)
+    start, stop = rows.start, rows.stop
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.active
+        # max_row comes from the sheet's dimension record and may be missing
+        n_rows = (stop or sheet.max_row or 0) - start
+        rows = sheet.iter_rows(values_only=True)
+        header = list(next(rows, ()))
+        columns = column_names(settings)
+        for col in columns:
+            if col not in header:
+                raise ColumnNotFoundError(col)
+        positions = [header.index(col) for col in columns]
+        rows = itertools.islice(rows, start, stop)
+        done = 0
+        while True:
+            if n_rows > 0:
+                report(progress, min(99, 100 * done // n_rows), 'Streaming rows')
+            block = list(itertools.islice(rows, chunk_rows))
+            if not block:
+                break
+            done += len(block)
+            yield pd.DataFrame({col: [row[pos] if pos < len(row) else None for row in block]
+                                for col, pos in zip(columns, positions)})
+    finally:
+        workbook.close()
+
+
+def iter_chunks(path, settings, first_row=0, last_row=0, chunk_rows=CHUNK_ROWS, progress=None):
+    ext = os.path.splitext(path)[1].lower()
+    if ext in TEXT_EXTENSIONS:
+        return iter_csv_chunks(path, settings, first_row, last_row, chunk_rows, progress)
+    if ext == '.xls':
+        raise ValueError("Streaming needs .xlsx or .csv input; save .xls workbooks as .xlsx first.")
+    return iter_excel_chunks(path, settings, first_row, last_row, chunk_rows, progress)
+
+
+def stream_into(accumulator, path, settings, first_row=0, last_row=0, chunk_rows=CHUNK_ROWS,
+                progress=None):
+    # Feeds every chunk of the file to a CountAccumulator or GroupedCounts
+    chunks = iter_chunks(path, settings, first_row, last_row, chunk_rows, progress)
+    for timestamps, speed, direction in chunks:
+        accumulator.add(timestamps, speed, direction)
+    return accumulator
+
+
+def stream_counts(path, settings, speed_ranges, n_dir, start=None, end=None,
+                  first_row=0, last_row=0, chunk_rows=CHUNK_ROWS, progress=None):
+    accumulator = CountAccumulator(speed_ranges, n_dir, start, end)
+    return stream_into(accumulator, path, settings, first_row, last_row, chunk_rows, progress)
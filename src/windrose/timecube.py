@@ -0,0 +1,108 @@
+import numpy as np
+
+from .binning import DAY, HOUR, NAT, CountAccumulator, bin_index
+
+BUCKET_WIDTHS = (HOUR, DAY, 7 * DAY)
+# Largest cumulative count table to build before falling back to wider buckets
+MAX_CUBE_BYTES = 64 * 1024 * 1024
+
+
+class TimeCube:
+    # Cumulative speed x direction counts at time-bucket boundaries over the
+    # time-sorted rows. A date window is answered from two rows of the table plus
+    # a bincount over the partial buckets at either end, so the result is exact
+    # and costs the same however many rows lie inside the window.
+
+    def __init__(self, timestamps, speed, direction, speed_ranges, n_dir, bucket=None):
+        self.speed_ranges = list(speed_ranges)
+        self.n_dir = n_dir
+        self.size = len(self.speed_ranges) * n_dir
+
+        timestamps = np.asarray(timestamps)
+        speed = np.asarray(speed)
+        direction = np.asarray(direction)
+        if len(timestamps) > 1 and np.any(timestamps[1:] < timestamps[:-1]):
+            order = np.argsort(timestamps, kind='stable')
+            timestamps, speed, direction = timestamps[order], speed[order], direction[order]
+        self.timestamps = timestamps
+        # shifted by one so unbinned rows count in column 0, which is dropped later
+        self.flat = (bin_index(speed, direction, self.speed_ranges, n_dir) + 1).astype(np.int16)
+        finite = np.isfinite(speed)
+        self.speed = np.where(finite, speed, 0)
+        self.finite = finite
+
+        self.bucket = bucket or self.choose_bucket(timestamps, self.size)
+        buckets = timestamps // self.bucket
+        starts = np.flatnonzero(buckets[1:] != buckets[:-1]) + 1
+        if len(timestamps):
+            self.boundaries = np.concatenate(([0], starts, [len(timestamps)]))
+        else:
+            self.boundaries = np.zeros(1, dtype=np.intp)
+
+        n_buckets = len(self.boundaries) - 1
+        bucket_of_row = np.repeat(np.arange(n_buckets), np.diff(self.boundaries))
+        per_bucket = np.bincount(bucket_of_row * (self.size + 1) + self.flat,
+                                 minlength=n_buckets * (self.size + 1))
+        per_bucket = per_bucket.reshape(n_buckets, self.size + 1)[:, 1:]
+        self.cum_counts = np.zeros((n_buckets + 1, self.size), dtype=np.int64)
+        np.cumsum(per_bucket, axis=0, out=self.cum_counts[1:])
+        self.cum_speed = np.concatenate(([0.0], np.cumsum(
+            np.add.reduceat(self.speed, self.boundaries[:-1], dtype=np.float64)
+            if n_buckets else [])))
+        self.cum_finite = np.concatenate(([0], np.cumsum(
+            np.add.reduceat(finite, self.boundaries[:-1], dtype=np.int64)
+            if n_buckets else [])))
+
+    @staticmethod
+    def choose_bucket(timestamps, size):
+        valid = timestamps[timestamps != NAT]
+        if len(valid) == 0:
+            return BUCKET_WIDTHS[0]
+        span = int(valid[-1]) - int(valid[0])
+        for width in BUCKET_WIDTHS:
+            if (span // width + 2) * size * 8 <= MAX_CUBE_BYTES:
+                return width
+        return BUCKET_WIDTHS[-1]
+
+    def matches(self, speed_ranges, n_dir):
+        return self.n_dir == n_dir and self.speed_ranges == list(speed_ranges)
+
+    def time_range(self):
+        valid = self.timestamps[self.timestamps != NAT]
+        if len(valid) == 0:
+            return None
+        return int(valid[0]), int(valid[-1])
+
+    def _partial(self, first, last):
+        counts = np.bincount(self.flat[first:last], minlength=self.size + 1)[1:]
+        speed_sum = float(self.speed[first:last].sum(dtype=np.float64))
+        return counts, speed_sum, int(self.finite[first:last].sum())
+
+    def query(self, start, end):
+        # Same result as feeding every row into CountAccumulator(start, end)
+        first = int(np.searchsorted(self.timestamps, start, side='left'))
+        last = int(np.searchsorted(self.timestamps, end, side='right'))
+        last = max(first, last)
+        k0 = int(np.searchsorted(self.boundaries, first, side='left'))
+        k1 = int(np.searchsorted(self.boundaries, last, side='right')) - 1
+        if k0 < k1:
+            counts = self.cum_counts[k1] - self.cum_counts[k0]
+            speed_sum = self.cum_speed[k1] - self.cum_speed[k0]
+            speed_count = int(self.cum_finite[k1] - self.cum_finite[k0])
+            for lo, hi in ((first, self.boundaries[k0]), (self.boundaries[k1], last)):
+                part_counts, part_sum, part_count = self._partial(lo, hi)
+                counts = counts + part_counts
+                speed_sum += part_sum
+                speed_count += part_count
+        else:
+            counts, speed_sum, speed_count = self._partial(first, last)
+
+        result = CountAccumulator(self.speed_ranges, self.n_dir, start, end)
+        result.counts = counts.reshape(len(self.speed_ranges), self.n_dir)
+        result.total = last - first
+        result.speed_sum = float(speed_sum)
+        result.speed_count = speed_count
+        if last > first:
+            result.first_time = int(self.timestamps[first])
+            result.last_time = int(self.timestamps[last - 1])
+        return result
@@ -0,0 +1,273 @@
+import re
+
+import numpy as np
+import pandas as pd
+
+from .binning import DAY, NAT
+
+SECOND = 10**9
+# Excel serial dates count days from 1899-12-30 (absorbing the 1900 leap-year bug)
+EXCEL_EPOCH_DAYS = -25569
+# Numeric date columns are told apart by magnitude: serial days stay below this
+# until the year 29349, epoch seconds stay above it after 1970-04-26
+MAX_SERIAL_DAYS = 10**7
+MAX_EPOCH_SECONDS = 10**11
+MAX_EPOCH_MILLISECONDS = 10**14
+SAMPLE_ROWS = 1000
+# The whole days int64 nanoseconds can hold (1677-09-21 12:12 to 2262-04-11
+# 23:47); dates outside them, usually typos such as year 0023, become NaT
+# rather than wrapping around to another date
+MIN_DATE = np.datetime64('1677-09-22')
+MAX_DATE = np.datetime64('2262-04-10T23:59:59.999999')
+MIN_DAYS = int(MIN_DATE.astype(np.int64))
+MAX_DAYS = int(MAX_DATE.astype('datetime64[D]').astype(np.int64))
+MIN_MILLISECONDS = MIN_DAYS * 86400 * 1000
+MAX_MILLISECONDS = (MAX_DAYS + 1) * 86400 * 1000 - 1
+
+QT_TOKENS = {'yyyy': '%Y', 'yy': '%y', 'MM': '%m', 'dd': '%d', 'HH': '%H', 'mm': '%M',
+             'ss': '%S', 'zzz': '%f'}
+QT_TOKEN_RE = re.compile('|'.join(sorted(QT_TOKENS, key=len, reverse=True)))
+STRFTIME_TOKENS = {directive: token for token, directive in QT_TOKENS.items()}
+STRFTIME_TOKEN_RE = re.compile('|'.join(re.escape(d) for d in STRFTIME_TOKENS))
+# Layouts tried when the configured format does not fit the data, most common
+# first; values fitting both the day-first and the month-first layout are
+# ambiguous and never read either way without the format being set
+CANDIDATE_FORMATS = (
+    '%Y-%m-%d %H:%M:%S', '%Y-%m-%dT%H:%M:%S', '%Y-%m-%d %H:%M', '%Y-%m-%dT%H:%M',
+    '%Y/%m/%d %H:%M:%S', '%Y/%m/%d %H:%M', '%d/%m/%Y %H:%M:%S', '%d/%m/%Y %H:%M',
+    '%m/%d/%Y %H:%M:%S', '%m/%d/%Y %H:%M', '%d.%m.%Y %H:%M:%S', '%d.%m.%Y %H:%M',
+    '%d-%m-%Y %H:%M:%S', '%d-%m-%Y %H:%M', '%Y%m%d%H%M%S', '%Y%m%d%H%M', '%Y-%m-%d',
+)
+# Layouts pandas parses with its own ISO 8601 fast path; every other layout goes
+# through strptime there, which is over ten times slower than parse_fixed_width
+ISO_FORMAT_RE = re.compile(r'%Y-%m-%d([ T]%H(:%M(:%S(\.%f)?)?)?)?')
+# Directives the fixed-width fast path reads, with their widths and valid ranges
+FIXED_FIELDS = {'Y': (4, 1, 9999), 'm': (2, 1, 12), 'd': (2, 1, 31),
+                'H': (2, 0, 23), 'M': (2, 0, 59), 'S': (2, 0, 59)}
+
+
+class DateFormatError(ValueError):
+    pass
+
+
+def to_nanoseconds(dates):
+    # datetime64 values of any unit as int64 nanoseconds, NaT for missing dates
+    # and for dates nanoseconds cannot hold
+    dates = np.asarray(dates)
+    inside = (dates >= MIN_DATE) & (dates <= MAX_DATE)
+    timestamps = np.full(len(dates), NAT, dtype=np.int64)
+    timestamps[inside] = dates[inside].astype('datetime64[ns]').view(np.int64)
+    return timestamps
+
+
+def qt_to_strftime(date_format):
+    # Qt's date format (yyyy-MM-dd HH:mm:ss) as a strftime format, in one pass
+    # so tokens produced by one replacement are never rewritten by another
+    return QT_TOKEN_RE.sub(lambda match: QT_TOKENS[match.group(0)], date_format)
+
+
+def strftime_to_qt(fmt):
+    # For messages: a strftime format in the Qt style the settings use
+    return STRFTIME_TOKEN_RE.sub(lambda match: STRFTIME_TOKENS[match.group(0)], fmt)
+
+
+def fixed_layout(fmt):
+    # [(offset, width, directive)] and the literal bytes of a format made only
+    # of fixed-width numeric fields, or None if it has anything else
+    fields = []
+    literals = []
+    offset = 0
+    i = 0
+    while i < len(fmt):
+        if fmt[i] == '%':
+            directive = fmt[i + 1:i + 2]
+            if directive not in FIXED_FIELDS:
+                return None
+            width = FIXED_FIELDS[directive][0]
+            fields.append((offset, width, directive))
+            offset += width
+            i += 2
+        else:
+            if not fmt[i].isascii():
+                return None
+            literals.append((offset, ord(fmt[i])))
+            offset += 1
+            i += 1
+    if 'Y' not in {field[2] for field in fields}:
+        return None
+    return fields, literals, offset
+
+
+def parse_fixed_width(strings, fmt):
+    # Vectorized parse of equal-length ASCII strings in a fixed-width layout: the
+    # strings are viewed as a byte matrix and every field is read with a few
+    # array operations. Returns None if any string does not fit, so the caller
+    # can fall back to pandas, which reports the offending value.
+    layout = fixed_layout(fmt)
+    if layout is None or len(strings) == 0:
+        return None
+    fields, literals, width = layout
+    try:
+        # one spare byte shows strings that are too long; shorter ones are padded
+        # with zero bytes, which fail the digit and literal checks below
+        encoded = strings.astype(f'S{width + 1}')
+    except (UnicodeEncodeError, ValueError):
+        return None
+    matrix = encoded.view(np.uint8).reshape(len(strings), width + 1)
+    if np.any(matrix[:, width]):
+        return None
+    for offset, char in literals:
+        if np.any(matrix[:, offset] != char):
+            return None
+    values = {'m': 1, 'd': 1, 'H': 0, 'M': 0, 'S': 0}
+    for offset, size, directive in fields:
+        value = np.zeros(len(strings), dtype=np.int64)
+        for column in range(offset, offset + size):
+            # bytes below '0' wrap around, so one comparison rejects non-digits
+            digit = matrix[:, column] - np.uint8(ord('0'))
+            if np.any(digit > 9):
+                return None
+            value *= 10
+            value += digit
+        low, high = FIXED_FIELDS[directive][1:]
+        if np.any((value < low) | (value > high)):
+            return None
+        values[directive] = value
+    months = ((values['Y'] - 1970) * 12 + values['m'] - 1).astype('datetime64[M]')
+    days = months.astype('datetime64[D]').astype(np.int64) + values['d'] - 1
+    month_ends = (months + 1).astype('datetime64[D]').astype(np.int64)
+    if np.any(days >= month_ends):
+        return None
+    timestamps = (days * DAY + values['H'] * 3600 * SECOND + values['M'] * 60 * SECOND
+                  + values['S'] * SECOND)
+    # days outside the range wrap around when multiplied, so they are replaced
+    return np.where((days >= MIN_DAYS) & (days <= MAX_DAYS), timestamps, NAT)
+
+
+def sample(values, size=SAMPLE_ROWS):
+    # Evenly spaced values across the whole column, not just its head
+    if len(values) <= size:
+        return values
+    return values[np.linspace(0, len(values) - 1, size).astype(np.intp)]
+
+
+def fits(strings, fmt):
+    try:
+        pd.to_datetime(pd.Series(strings), format=fmt)
+    except (ValueError, TypeError):
+        return False
+    return True
+
+
+def swap_day_month(fmt):
+    return fmt.replace('%d', '\0').replace('%m', '%d').replace('\0', '%m')
+
+
+def infer_format(strings, preferred=None):
+    # preferred if it parses every sampled string, otherwise the first of
+    # CANDIDATE_FORMATS that does, or None. Strings that fit a day-first and a
+    # month-first layout alike raise DateFormatError.
+    strings = sample(strings)
+    if preferred and fits(strings, preferred):
+        return preferred
+    for fmt in CANDIDATE_FORMATS:
+        if fits(strings, fmt):
+            swapped = swap_day_month(fmt)
+            if swapped != fmt and swapped in CANDIDATE_FORMATS and fits(strings, swapped):
+                raise DateFormatError(
+                    f"Dates such as '{strings[0]}' do not match the date format "
+                    f"'{strftime_to_qt(preferred or '')}' and could be "
+                    f"'{strftime_to_qt(fmt)}' or '{strftime_to_qt(swapped)}'; "
+                    f"set the date format the file uses")
+            return fmt
+    return None
+
+
+def date_strings(values):
+    # The column as an object array and a sample of its non-empty values
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    items = series.to_numpy(dtype=object)
+    picked = sample(items)
+    return items, picked[pd.notna(picked)]
+
+
+def date_layout(values, date_format):
+    # The strftime layout of a column of date strings: date_format (Qt style)
+    # when the sampled values fit it, otherwise the common layout they fit, as
+    # in parse_timestamps. None for columns without strings, which need no
+    # layout. Files read in chunks decide it once, from the first chunk with
+    # dates, and pass it to parse_timestamps for every chunk so all of them are
+    # read the same way.
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if series.dtype != object and not pd.api.types.is_string_dtype(series.dtype):
+        return None
+    _, picked = date_strings(series)
+    if len(picked) == 0 or {type(item) for item in picked} != {str}:
+        return None
+    preferred = qt_to_strftime(date_format)
+    # falls back to the configured format, whose error names a bad value
+    return infer_format(picked, preferred) or preferred
+
+
+def parse_numeric(values):
+    # Excel serial days or epoch seconds/milliseconds, told apart by magnitude;
+    # rounded to the millisecond, below which float64 days are not exact
+    values = np.asarray(values, dtype=np.float64)
+    finite = np.isfinite(values)
+    if not finite.any():
+        return np.full(len(values), NAT, dtype=np.int64)
+    magnitude = np.median(np.abs(values[finite]))
+    if magnitude < MAX_SERIAL_DAYS:
+        millis = (values + EXCEL_EPOCH_DAYS) * 86400 * 1000
+    elif magnitude < MAX_EPOCH_SECONDS:
+        millis = values * 1000
+    elif magnitude < MAX_EPOCH_MILLISECONDS:
+        millis = values
+    else:
+        millis = values / 10**6
+    millis = np.round(millis)
+    inside = finite & (millis >= MIN_MILLISECONDS) & (millis <= MAX_MILLISECONDS)
+    timestamps = np.full(len(values), NAT, dtype=np.int64)
+    timestamps[inside] = millis[inside].astype(np.int64) * 10**6
+    return timestamps
+
+
+def parse_timestamps(values, date_format, layout=None):
+    # int64 nanosecond timestamps (NaT as the int64 minimum) for a date column
+    # holding datetimes, strings in date_format (Qt style) or another common
+    # layout, Excel serial dates, or epoch seconds. The layout is decided from a
+    # sample of the non-empty values rather than the first row, unless the
+    # strftime layout is passed in (see date_layout). Dates outside the
+    # nanosecond range become NaT.
+    series = values if isinstance(values, pd.Series) else pd.Series(values)
+    if pd.api.types.is_datetime64_any_dtype(series.dtype):
+        if getattr(series.dt, 'tz', None) is not None:
+            series = series.dt.tz_convert(None)
+        return to_nanoseconds(series.to_numpy())
+    if pd.api.types.is_bool_dtype(series.dtype):
+        raise DateFormatError(f"Column '{series.name}' does not hold dates")
+    if pd.api.types.is_numeric_dtype(series.dtype):
+        return parse_numeric(series.to_numpy())
+
+    items, picked = date_strings(series)
+    kinds = {type(item) for item in picked}
+    try:
+        if kinds == {str}:
+            fmt = layout or date_layout(series, date_format)
+            if not ISO_FORMAT_RE.fullmatch(fmt):
+                present = pd.notna(items)
+                parsed = parse_fixed_width(items[present], fmt)
+                if parsed is not None:
+                    timestamps = np.full(len(items), NAT, dtype=np.int64)
+                    timestamps[present] = parsed
+                    return timestamps
+            dates = pd.to_datetime(series, format=fmt)
+        elif kinds and all(issubclass(kind, (int, float, np.integer, np.floating)) for kind in kinds):
+            return parse_numeric(pd.to_numeric(series, errors='coerce').to_numpy(dtype=np.float64))
+        else:
+            dates = pd.to_datetime(series)
+    except (ValueError, TypeError, OverflowError) as e:
+        raise DateFormatError(str(e)) from e
+    if getattr(dates.dt, 'tz', None) is not None:
+        dates = dates.dt.tz_convert(None)
+    return to_nanoseconds(dates.to_numpy())
@@ -0,0 +1,160 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .binning import DAY, NAT, bin_index, window_mask
+from .pipeline import report
+
+METHODS = ('bootstrap', 'block')
+DEFAULT_REPLICATES = 2000
+DEFAULT_CONFIDENCE = 0.95
+# Ten-minute readings within a day are strongly correlated, so the block
+# bootstrap resamples whole days by default
+DEFAULT_BLOCK = DAY
+# Replicates drawn per task; each task has its own random stream, so the
+# intervals for a seed are the same however many workers run
+REPLICATE_CHUNK = 250
+
+
+class BlockCounts:
+    # Rows per time block and cell, the input of the bootstrap. Cell 0 holds the
+    # rows that fall in no speed/direction bin, which still count towards the
+    # frequencies' denominator; cell 1 + s * n_dir + d holds speed range s and
+    # direction bin d. Fed chunk by chunk like CountAccumulator, with the same
+    # inclusive start and end. Rows without a timestamp form one block together.
+
+    def __init__(self, speed_ranges, n_dir, start=None, end=None, block=DEFAULT_BLOCK):
+        self.speed_ranges = list(speed_ranges)
+        self.n_dir = n_dir
+        self.start = start
+        self.end = end
+        self.block = block
+        self.size = len(self.speed_ranges) * n_dir + 1
+        self.blocks = np.zeros(0, dtype=np.int64)
+        self.counts = np.zeros((0, self.size), dtype=np.int64)
+
+    def add(self, timestamps, speed, direction):
+        timestamps = np.asarray(timestamps)
+        speed = np.asarray(speed)
+        direction = np.asarray(direction)
+        mask = window_mask(timestamps, self.start, self.end)
+        if mask is not None:
+            timestamps, speed, direction = timestamps[mask], speed[mask], direction[mask]
+        if len(timestamps) == 0:
+            return
+        blocks, rows = np.unique(timestamps // self.block, return_inverse=True)
+        flat = bin_index(speed, direction, self.speed_ranges, self.n_dir) + 1
+        counts = np.bincount(rows * self.size + flat, minlength=len(blocks) * self.size)
+        self.combine(blocks, counts.reshape(len(blocks), self.size))
+
+    def combine(self, blocks, counts):
+        merged = np.union1d(self.blocks, blocks)
+        combined = np.zeros((len(merged), self.size), dtype=np.int64)
+        combined[np.searchsorted(merged, self.blocks)] = self.counts
+        combined[np.searchsorted(merged, blocks)] += counts
+        self.blocks, self.counts = merged, combined
+
+    @classmethod
+    def from_snapshot(cls, snapshot, start=None, end=None, block=DEFAULT_BLOCK):
+        # Blocks from the buckets of a CountSnapshot that overlap the window, at
+        # the snapshot's bucket resolution; blocks shorter than a bucket are
+        # widened to one bucket
+        block = max(block, snapshot.bucket)
+        counts = BlockCounts(snapshot.speed_ranges, snapshot.n_dir, start, end, block)
+        first = 0 if start is None else \
+            int(np.searchsorted(snapshot.buckets, start // snapshot.bucket))
+        last = len(snapshot.buckets) if end is None else \
+            int(np.searchsorted(snapshot.buckets, end // snapshot.bucket, side='right'))
+        last = max(first, last)
+        binned = snapshot.counts[first:last].astype(np.int64)
+        cells = np.column_stack((snapshot.totals[first:last] - binned.sum(axis=1), binned))
+        if len(cells):
+            blocks, rows = np.unique(snapshot.buckets[first:last] * snapshot.bucket // block,
+                                     return_inverse=True)
+            grouped = np.zeros((len(blocks), counts.size), dtype=np.int64)
+            np.add.at(grouped, rows, cells)
+            counts.combine(blocks, grouped)
+        if start is None and end is None and snapshot.undated.total:
+            undated = snapshot.undated.counts.ravel()
+            cells = np.concatenate(([snapshot.undated.total - undated.sum()], undated))
+            counts.combine(np.array([NAT // block]), cells[None, :])
+        return counts
+
+    @property
+    def total(self):
+        return int(self.counts.sum())
+
+
+class RoseIntervals:
+    # Percentile bounds, in percent, for every speed x direction frequency,
+    # shaped like CountAccumulator.counts
+
+    def __init__(self, lower, upper, method, replicates, confidence, block=None):
+        self.lower = lower
+        self.upper = upper
+        self.method = method
+        self.replicates = replicates
+        self.confidence = confidence
+        self.block = block
+
+    @property
+    def nbytes(self):
+        return self.lower.nbytes + self.upper.nbytes
+
+
+def draw_replicates(counts, method, replicates, seed_sequence):
+    # Frequencies in percent of every cell for a number of bootstrap replicates,
+    # drawn without touching individual rows: the row bootstrap is a multinomial
+    # draw over the cell counts, the block bootstrap weights the per-block counts
+    # by how often each block is picked (a uniform multinomial, counted from
+    # random picks with one bincount, which is several times faster)
+    rng = np.random.default_rng(seed_sequence)
+    if method == 'bootstrap':
+        totals = counts.sum(axis=0)
+        total = int(totals.sum())
+        drawn = rng.multinomial(total, totals / total, size=replicates).astype(np.float64)
+        sizes = np.full(replicates, float(total))
+    else:
+        n_blocks = len(counts)
+        picks = rng.integers(0, n_blocks, size=(replicates, n_blocks))
+        picks += np.arange(replicates)[:, None] * n_blocks
+        weights = np.bincount(picks.ravel(), minlength=replicates * n_blocks)
+        weights = weights.reshape(replicates, n_blocks)
+        drawn = weights.astype(np.float64) @ counts.astype(np.float64)
+        sizes = drawn.sum(axis=1)
+    return drawn[:, 1:] / np.maximum(sizes, 1)[:, None] * 100
+
+
+def confidence_intervals(block_counts, method='block', replicates=DEFAULT_REPLICATES,
+                         confidence=DEFAULT_CONFIDENCE, seed=0, workers=None, progress=None):
+    # Percentile bootstrap intervals for the frequencies of a BlockCounts.
+    # Replicates are drawn in chunks on a thread pool; NumPy's multinomial and
+    # matrix product do their work outside the GIL.
+    if method not in METHODS:
+        raise ValueError(f"Unknown interval method '{method}'")
+    if not 0 < confidence < 1:
+        raise ValueError("Confidence must be between 0 and 1")
+    shape = (len(block_counts.speed_ranges), block_counts.n_dir)
+    block = block_counts.block if method == 'block' else None
+    if block_counts.total == 0:
+        empty = np.zeros(shape)
+        return RoseIntervals(empty, empty, method, replicates, confidence, block)
+    sizes = [min(REPLICATE_CHUNK, replicates - first)
+             for first in range(0, replicates, REPLICATE_CHUNK)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    parts = [None] * len(sizes)
+    pool = ThreadPoolExecutor(max_workers=workers or os.cpu_count() or 1)
+    try:
+        futures = [pool.submit(draw_replicates, block_counts.counts, method, size, seeds[i])
+                   for i, size in enumerate(sizes)]
+        for i, future in enumerate(futures):
+            parts[i] = future.result()
+            report(progress, 90 * (i + 1) // len(futures), 'Resampling')
+    finally:
+        pool.shutdown(wait=False, cancel_futures=True)
+    percents = np.concatenate(parts)
+    tail = (1 - confidence) / 2
+    lower, upper = np.quantile(percents, [tail, 1 - tail], axis=0)
+    return RoseIntervals(lower.reshape(shape), upper.reshape(shape), method, replicates,
+                         confidence, block)
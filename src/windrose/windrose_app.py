@@ -1,15 +1,53 @@
-import pandas as pd
 import numpy as np
-from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QFileDialog, QPushButton, QSpinBox, QLabel, QDateTimeEdit, QGroupBox, QMessageBox, QComboBox, QMenuBar, QMenu, QAction)
-from PyQt5.QtCore import Qt
+from PyQt5.QtWidgets import (QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QFileDialog, QPushButton, QSpinBox, QLabel, QDateTimeEdit, QGroupBox, QMessageBox, QComboBox, QMenuBar, QMenu, QAction, QProgressBar, QSlider, QInputDialog, QActionGroup)
+from PyQt5.QtCore import Qt, QThreadPool, QFileSystemWatcher, QTimer
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
 from matplotlib.figure import Figure
-import matplotlib.pyplot as plt
 from datetime import datetime
-import xml.etree.ElementTree as ET
+import os
 
 from ui.speed_range_widget import SpeedRangeWidget
 from ui.data_config_widget import DataConfigWidget
+from ui.grouped_rose_dialog import GroupedRoseDialog
+from ui.performance_panel import PerformancePanel, stage_summary
+from .cache import ColumnCache
+from .pipeline import count_columns, feed_columns, load_records, report
+from .results import ResultCache, result_key
+from .profiling import PROFILER, enable_from_env
+from .startup import PROFILE
+from .timecube import TimeCube
+from .uncertainty import BlockCounts, confidence_intervals
+from .grouped import GroupedCounts
+from .render import DEFAULT_COLORS, RoseRenderer, draw_grouped
+from .workers import Cancelled, Worker
+
+# pandas and the modules built on it (file reading, streaming, watched-file
+# snapshots and the exports) are imported where they are first used, so the
+# window shows without loading them
+
+# Settings a background result depends on; loading ignores the plot settings
+SNAPSHOT_KEYS = ('source', 'sources', 'station_tag', 'stream', 'watch', 'columns',
+                 'first_row', 'last_row', 'speed_ranges', 'n_dir', 'window')
+LOAD_KEYS = ('source', 'sources', 'station_tag', 'stream', 'watch', 'columns',
+             'first_row', 'last_row')
+# Bootstrap methods offered for the confidence intervals of exported tables
+INTERVAL_CHOICES = (('Off', None),
+                    ('Bootstrap (Independent Rows)', 'bootstrap'),
+                    ('Block Bootstrap (Whole Days)', 'block'))
+# Choices for labelling the rows of several files with their station
+STATION_TAG_CHOICES = (("No, merge into one dataset", None),
+                       ("By file name", 'file'),
+                       ("By folder name", 'folder'))
+# A watched file's snapshot is binned, so it also depends on the bins
+WATCH_KEYS = LOAD_KEYS + ('speed_ranges', 'n_dir')
+# Loggers may write a batch in several steps; wait for them to settle
+WATCH_DELAY_MS = 1000
+
+
+def to_datetime(ns):
+    # int64 nanoseconds as the datetime QDateTimeEdit takes, to the microsecond
+    return np.datetime64(int(ns), 'ns').astype('datetime64[us]').item()
+
 
 class WindRoseApp(QMainWindow):
     def __init__(self):
@@ -17,10 +55,18 @@ class WindRoseApp(QMainWindow):
         self.setWindowTitle('Wind Rose Analyzer')
         self.setGeometry(100, 100, 1200, 800)
         # Define default colors to match the image
-        self.default_colors = ['blue', 'cyan', 'lightgreen', 'yellow', 'red', 'darkred']
+        self.default_colors = list(DEFAULT_COLORS)
         
+        PROFILE.mark('Window')
+
+        # Stage timings, recorded only while the panel shows or a log is written
+        self.performance_panel = PerformancePanel(self)
+        self.addDockWidget(Qt.RightDockWidgetArea, self.performance_panel)
+        self.performance_panel.hide()
+
         # Create menu bar
         self.create_menu_bar()
+        PROFILE.mark('Menu bar')
         
         # Main widget and layout
         main_widget = QWidget()
@@ -78,6 +124,13 @@ class WindRoseApp(QMainWindow):
         date_layout.addWidget(self.start_date)
         date_layout.addWidget(QLabel('End:'))
         date_layout.addWidget(self.end_date)
+        # Drags the current window across the data once a file is loaded
+        self.window_slider = QSlider(Qt.Horizontal)
+        self.window_slider.setRange(0, 1000)
+        self.window_slider.setEnabled(False)
+        self.window_slider.valueChanged.connect(self.slide_window)
+        date_layout.addWidget(QLabel('Window Position:'))
+        date_layout.addWidget(self.window_slider)
         date_group.setLayout(date_layout)
         control_layout.addWidget(date_group)
 
@@ -88,14 +141,57 @@ class WindRoseApp(QMainWindow):
 
         # Add control panel to main layout
         layout.addWidget(control_panel, stretch=1)
+        PROFILE.mark('Control panel')
         # Matplotlib figure
         self.figure = Figure(figsize=(8, 8))
         self.canvas = FigureCanvas(self.figure)
+        self.rose_renderer = RoseRenderer(self.figure, self.default_colors, blit=True)
         layout.addWidget(self.canvas, stretch=3)
+        PROFILE.mark('Figure canvas')
         self.data = None
         self.csvdata = None
-        self.raw_data = None
         self.current_filename = "Unknown File"
+        self.stream_source = None
+        self.sources = None
+        self.station_tag = None
+        self.column_cache = ColumnCache()
+        self.data_key = None
+        self.time_cube = None
+        self.result_cache = ResultCache()
+        self.interval_method = None
+        self.watch_source = None
+        self.count_snapshot = None
+        self.file_watcher = QFileSystemWatcher(self)
+        self.file_watcher.fileChanged.connect(self.watched_file_changed)
+        self.watch_timer = QTimer(self)
+        self.watch_timer.setSingleShot(True)
+        self.watch_timer.setInterval(WATCH_DELAY_MS)
+        self.watch_timer.timeout.connect(self.refresh_watched)
+
+        # Background jobs report to the status bar
+        self.thread_pool = QThreadPool.globalInstance()
+        self.current_job = None
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(200)
+        self.progress_bar.hide()
+        self.cancel_button = QPushButton('Cancel')
+        self.cancel_button.clicked.connect(self.cancel_job)
+        self.cancel_button.hide()
+        self.statusBar().addPermanentWidget(self.progress_bar)
+        self.statusBar().addPermanentWidget(self.cancel_button)
+        self.stage_label = QLabel()
+        self.stage_label.hide()
+        self.statusBar().addPermanentWidget(self.stage_label)
+        self.performance_panel.recorded.connect(
+            lambda entry: self.stage_label.setText(stage_summary(entry)))
+        self.performance_panel.visibilityChanged.connect(lambda _: self.update_profiling())
+        self.performance_panel.memory_check.toggled.connect(lambda _: self.update_profiling())
+        self.performance_panel.clear_button.clicked.connect(PROFILER.clear)
+        self.stage_listener = self.performance_panel.recorded.emit
+        PROFILER.listeners.append(self.stage_listener)
+        self.log_stages_action.setChecked(enable_from_env() is not None)
+        self.update_profiling()
+        PROFILE.mark('State and status bar')
 
     def create_menu_bar(self):
         menubar = self.menuBar()
@@ -112,6 +208,22 @@ class WindRoseApp(QMainWindow):
         open_action.setShortcut('Ctrl+O')
         open_action.triggered.connect(self.load_excel)
         file_menu.addAction(open_action)
+
+        stream_action = QAction('Stream Large File', self)
+        stream_action.triggered.connect(self.stream_file)
+        file_menu.addAction(stream_action)
+
+        watch_action = QAction('Watch Growing File', self)
+        watch_action.triggered.connect(self.watch_file)
+        file_menu.addAction(watch_action)
+
+        open_files_action = QAction('Open Multiple Files', self)
+        open_files_action.triggered.connect(self.open_files)
+        file_menu.addAction(open_files_action)
+
+        open_folder_action = QAction('Open Folder', self)
+        open_folder_action.triggered.connect(self.open_folder)
+        file_menu.addAction(open_folder_action)
         
         file_menu.addSeparator()
         
@@ -133,7 +245,45 @@ class WindRoseApp(QMainWindow):
         export_xml_action = QAction('Export Wind Rose XML', self)
         export_xml_action.triggered.connect(self.export_XML)
         export_menu.addAction(export_xml_action)
+
+        export_menu.addSeparator()
+        self.unbinned_action = QAction('Report Unbinned Rows', self, checkable=True)
+        export_menu.addAction(self.unbinned_action)
         
+        # Analysis Menu
+        analysis_menu = menubar.addMenu('Analysis')
+
+        for title, grouping in (('Monthly Wind Roses', 'month'),
+                                ('Seasonal Wind Roses', 'season'),
+                                ('Diurnal Wind Roses', 'hour')):
+            grouped_action = QAction(title, self)
+            grouped_action.triggered.connect(lambda _, grouping=grouping: self.show_grouped(grouping))
+            analysis_menu.addAction(grouped_action)
+
+        stations_action = QAction('Compare Stations', self)
+        stations_action.triggered.connect(self.show_stations)
+        analysis_menu.addAction(stations_action)
+
+        intervals_menu = analysis_menu.addMenu('Confidence Intervals in Exports')
+        interval_group = QActionGroup(self)
+        for title, method in INTERVAL_CHOICES:
+            interval_action = QAction(title, self, checkable=True)
+            interval_action.setChecked(method is None)
+            interval_action.triggered.connect(lambda _, method=method: self.set_interval_method(method))
+            interval_group.addAction(interval_action)
+            intervals_menu.addAction(interval_action)
+        
+        # View Menu
+        view_menu = menubar.addMenu('View')
+
+        panel_action = self.performance_panel.toggleViewAction()
+        panel_action.setText('Performance Panel')
+        view_menu.addAction(panel_action)
+
+        self.log_stages_action = QAction('Log Stage Timings...', self, checkable=True)
+        self.log_stages_action.triggered.connect(self.log_stages)
+        view_menu.addAction(self.log_stages_action)
+
         # Help Menu
         help_menu = menubar.addMenu('Help')
         
@@ -147,10 +297,16 @@ class WindRoseApp(QMainWindow):
 
     def new_file(self):
         # Reset the application state
-        self.raw_data = None
         self.data = None
         self.csvdata = None
+        self.stream_source = None
+        self.sources = None
+        self.station_tag = None
+        self.stop_watching()
         self.current_filename = "Unknown File"
+        self.cancel_job()
+        self.reset_time_index()
+        self.result_cache.clear()
         self.figure.clear()
         self.canvas.draw()
         
@@ -214,190 +370,661 @@ class WindRoseApp(QMainWindow):
             self.speed_layout.addWidget(range_widget)
             self.speed_ranges.append(range_widget)
 
+    def get_speed_ranges(self):
+        return [(w.min_speed.value(), w.max_speed.value()) for w in self.speed_ranges]
+
     def update_speed_categories(self):
         self.setup_default_ranges()
 
-    def process_data(self):
-        if self.raw_data is None:
-            return None
-        try:
-            date_time_col = self.data_config.date_time_col.text()
-            wind_speed_col = self.data_config.wind_speed_col.text()
-            wind_dir_col = self.data_config.wind_dir_col.text()
-            first_row = self.data_config.first_row.value()
-            last_row = self.data_config.last_row.value()
-            if last_row == 0:
-                df = self.raw_data.iloc[first_row:].copy()
-            else:
-                df = self.raw_data.iloc[first_row:last_row+1].copy()
-            required_cols = [date_time_col, wind_speed_col, wind_dir_col]
-            for col in required_cols:
-                if col not in df.columns:
-                    QMessageBox.critical(self, "Error", f"Column '{col}' not found in the data.")
-                    return None
+    def column_settings(self):
+        return {
+            'date_time_col': self.data_config.date_time_col.text(),
+            'wind_speed_col': self.data_config.wind_speed_col.text(),
+            'wind_dir_col': self.data_config.wind_dir_col.text(),
+            'date_format': self.data_config.date_format.text(),
+        }
+
+    def reset_time_index(self):
+        self.data_key = None
+        self.time_cube = None
+        self.window_slider.setEnabled(False)
+
+    def settings_snapshot(self):
+        # Everything a background job needs, read on the GUI thread up front
+        return {
+            'source': self.stream_source or self.current_filename,
+            'sources': self.sources,
+            'station_tag': self.station_tag,
+            'stream': self.stream_source is not None,
+            'watch': self.watch_source is not None,
+            'columns': self.column_settings(),
+            'first_row': self.data_config.first_row.value(),
+            'last_row': self.data_config.last_row.value(),
+            'speed_ranges': tuple(self.get_speed_ranges()),
+            'n_dir': self.dir_bins.value(),
+            'window': self.date_window(),
+        }
+
+    def run_job(self, message, fn, args, on_done, depends_on=SNAPSHOT_KEYS,
+                error_title="Data Processing Error"):
+        # Only the newest job counts: starting one cancels the previous one, and a
+        # result computed from settings that have changed since is dropped.
+        if self.current_job is not None:
+            self.current_job.cancel()
+        snapshot = self.settings_snapshot()
+        worker = Worker(fn, *args)
+        worker.signals.progress.connect(self.show_progress)
+        worker.signals.finished.connect(
+            lambda result: self.job_finished(worker, snapshot, depends_on, on_done, result))
+        worker.signals.failed.connect(lambda error: self.job_failed(worker, error, error_title))
+        self.current_job = worker
+        self.progress_bar.setValue(0)
+        self.progress_bar.show()
+        self.cancel_button.show()
+        self.statusBar().showMessage(message)
+        self.thread_pool.start(worker)
+
+    def end_job(self, worker):
+        if worker is not self.current_job:
+            return False
+        self.current_job = None
+        self.progress_bar.hide()
+        self.cancel_button.hide()
+        return True
+
+    def job_finished(self, worker, snapshot, depends_on, on_done, result):
+        if not self.end_job(worker):
+            return
+        current = self.settings_snapshot()
+        if any(snapshot[key] != current[key] for key in depends_on):
+            self.statusBar().showMessage("Settings changed while computing; result discarded", 5000)
+            return
+        self.statusBar().clearMessage()
+        on_done(result)
+
+    def job_failed(self, worker, error, error_title):
+        if not self.end_job(worker):
+            return
+        if isinstance(error, Cancelled):
+            self.statusBar().showMessage("Cancelled", 5000)
+            return
+        self.statusBar().clearMessage()
+        from .ingest import ColumnNotFoundError
+        from .timestamps import DateFormatError
+        if isinstance(error, ColumnNotFoundError):
+            QMessageBox.critical(self, "Error", f"Column '{error.args[0]}' not found in the data.")
+        elif isinstance(error, DateFormatError):
             date_format = self.data_config.date_format.text()
-            py_date_format = date_format.replace('yyyy', '%Y').replace('MM', '%m').replace('dd', '%d')
-            py_date_format = py_date_format.replace('HH', '%H').replace('mm', '%M').replace('ss', '%S')
-            try:
-                if isinstance(df[date_time_col].iloc[0], str):
-                    df['Date & Time'] = pd.to_datetime(df[date_time_col], format=py_date_format)
-                else:
-                    df['Date & Time'] = df[date_time_col]
-            except Exception as e:
-                QMessageBox.critical(self, "Date Format Error", \
-                                    f"Could not parse dates with format '{date_format}'.\nError: {str(e)}")
-                return None
-            df['Wind Speed'] = df[wind_speed_col]
-            df['Wind Direction'] = df[wind_dir_col]
-            return df
-        except Exception as e:
-            QMessageBox.critical(self, "Data Processing Error", f"Error processing data: {str(e)}")
+            QMessageBox.critical(self, "Date Format Error", \
+                                f"Could not parse dates with format '{date_format}'.\nError: {str(error)}")
+        else:
+            QMessageBox.critical(self, "Error", f"{error_title}: {str(error)}")
+
+    def update_profiling(self):
+        # Stages are timed only while someone looks at them
+        if self.performance_panel.isVisible() or PROFILER.log_path is not None:
+            PROFILER.enable(memory=self.performance_panel.memory_check.isChecked())
+            self.stage_label.show()
+        else:
+            PROFILER.disable()
+            self.stage_label.hide()
+
+    def log_stages(self, checked):
+        # Appends every stage to a JSON-lines file while checked
+        path = None
+        if checked:
+            path, _ = QFileDialog.getSaveFileName(self, "Log Stage Timings", "stages.jsonl",
+                                                  "JSON Lines (*.jsonl);;All Files (*)")
+            self.log_stages_action.setChecked(bool(path))
+        PROFILER.set_log(path or None)
+        self.update_profiling()
+
+    def closeEvent(self, event):
+        if self.stage_listener in PROFILER.listeners:
+            PROFILER.listeners.remove(self.stage_listener)
+        PROFILER.disable()
+        super().closeEvent(event)
+
+    def show_progress(self, percent, message):
+        self.progress_bar.setValue(percent)
+        self.statusBar().showMessage(message)
+
+    def cancel_job(self):
+        if self.current_job is not None:
+            self.current_job.cancel()
+            self.statusBar().showMessage("Cancelling...")
+
+    def process_data(self, progress, snapshot):
+        # Runs on a worker thread, so it only reads the snapshot, never the widgets
+        if snapshot['sources']:
+            from .multisource import load_sources
+            with PROFILER.stage('load files') as stage:
+                records = load_sources(list(snapshot['sources']), snapshot['columns'],
+                                       snapshot['first_row'], snapshot['last_row'],
+                                       snapshot['station_tag'], progress=progress)
+                stage.rows = len(records)
+            return records
+        with PROFILER.stage('load') as stage:
+            records = load_records(self.column_cache, snapshot['source'], snapshot['columns'],
+                                   progress, snapshot['first_row'], snapshot['last_row'])
+            stage.rows = len(records)
+        return records
+
+    def date_window(self):
+        start = self.start_date.dateTime().toPyDateTime()
+        end = self.end_date.dateTime().toPyDateTime()
+        window = (int(np.datetime64(start, 'ns').view(np.int64)),
+                  int(np.datetime64(end, 'ns').view(np.int64)))
+        if self.watch_source is not None and self.count_snapshot is not None:
+            # a watched file is counted per bucket, so the editors are moved to
+            # the bucket edges and the rose, table and XML cover the window shown
+            snapped = self.count_snapshot.snap(*window)
+            if snapped != window:
+                self.start_date.setDateTime(to_datetime(snapped[0]))
+                self.end_date.setDateTime(to_datetime(snapped[1]))
+            return snapped
+        return window
+
+    def compute_counts(self, progress, snapshot, data=None, window=True):
+        start, end = snapshot['window'] if window else (None, None)
+        if snapshot['stream'] or snapshot['watch']:
+            from .streaming import stream_counts
+            with PROFILER.stage('stream') as stage:
+                result = stream_counts(snapshot['source'], snapshot['columns'],
+                                       snapshot['speed_ranges'], snapshot['n_dir'], start, end,
+                                       snapshot['first_row'], snapshot['last_row'],
+                                       progress=progress)
+                stage.rows = result.total
+            return result
+        with PROFILER.stage('count', len(data)):
+            return count_columns(*data.columns, snapshot['speed_ranges'], snapshot['n_dir'],
+                                 start, end, progress)
+
+    def load_key(self, snapshot=None):
+        snapshot = snapshot or self.settings_snapshot()
+        return tuple(repr(snapshot[key]) for key in LOAD_KEYS)
+
+    def compute_rose(self, progress, snapshot, data, data_key, cube):
+        # Reuses the loaded data while the load settings are unchanged and the time
+        # cube while the bins are too, so a date-range change is a cube query
+        if snapshot['stream']:
+            return self.compute_counts(progress, snapshot), None, None
+        if data is None or data_key != self.load_key(snapshot):
+            data = self.process_data(progress, snapshot)
+            cube = None
+        if cube is None or not cube.matches(snapshot['speed_ranges'], snapshot['n_dir']):
+            report(progress, 95, 'Building time index')
+            with PROFILER.stage('time index', len(data)):
+                cube = TimeCube(*data.columns, snapshot['speed_ranges'], snapshot['n_dir'])
+        with PROFILER.stage('query') as stage:
+            result = cube.query(*snapshot['window'])
+            stage.rows = result.total
+        return result, data, cube
+
+    def result_key(self, snapshot=None):
+        # None when the source cannot be identified, which disables caching
+        snapshot = snapshot or self.settings_snapshot()
+        try:
+            identity = tuple(self.column_cache.key(path, snapshot['columns'])
+                             for path in snapshot['sources'] or (snapshot['source'],))
+        except OSError:
             return None
+        identity += (snapshot['station_tag'],)
+        fingerprint = (identity, snapshot['stream'], snapshot['first_row'], snapshot['last_row'])
+        return result_key(fingerprint, snapshot['window'], snapshot['n_dir'],
+                          snapshot['speed_ranges'])
+
+    def data_is_current(self, snapshot):
+        return snapshot['stream'] or snapshot['watch'] or \
+            (self.data is not None and self.data_key == self.load_key(snapshot))
 
     def update_wind_rose(self):
-        self.data = self.process_data()
-        if self.data is None:
+        if self.current_filename == "Unknown File":
             return
-        mask = (self.data['Date & Time'] >= self.start_date.dateTime().toPyDateTime()) & \
-            (self.data['Date & Time'] <= self.end_date.dateTime().toPyDateTime())
-        filtered_data = self.data[mask]
-        self.figure.clear()
-        gs = self.figure.add_gridspec(2, 1, height_ratios=[4, 1])
-        self.ax = self.figure.add_subplot(gs[0], projection='polar')
-        dir_bins = np.linspace(0, 360, self.dir_bins.value() + 1)
-        dir_centers = dir_bins[:-1] + np.diff(dir_bins) / 2
-        dir_radians = np.radians(dir_centers)
-        bottom = np.zeros(len(dir_centers))
-        total_hist = np.zeros(len(dir_centers))
-        for i, range_widget in enumerate(self.speed_ranges):
-            min_speed = range_widget.min_speed.value()
-            max_speed = range_widget.max_speed.value()
-            mask = (filtered_data['Wind Speed'] >= min_speed) & \
-                (filtered_data['Wind Speed'] <= max_speed)
-            speeds = filtered_data[mask]['Wind Direction']
-            hist, _ = np.histogram(speeds, bins=dir_bins)
-            hist = hist / len(filtered_data) * 100
-            total_hist += hist
-            label = f'{min_speed:.1f}-{max_speed:.1f}' if max_speed < 100 else f'{min_speed:.1f}+'
-            color = self.default_colors[i] if i < len(self.default_colors) else None
-            self.ax.bar(dir_radians, hist, width=np.radians(360/self.dir_bins.value()),
-                    bottom=bottom, label=f'{label} m/s', color=color)
-            bottom += hist
-        self.ax.set_theta_direction(-1)
-        self.ax.set_theta_zero_location('N')
-        self.ax.set_title('Wind Rose Diagram')
-        self.ax.legend(bbox_to_anchor=(1.2, 0.5), loc='center left')
-        wind_speeds = filtered_data['Wind Speed']
-        avg_speed = wind_speeds.mean()
-        prevailing_dir_idx = np.argmax(total_hist)
-        prevailing_dir = dir_centers[prevailing_dir_idx]
-        ax_text = self.figure.add_subplot(gs[1])
-        ax_text.axis('off')
+        snapshot = self.settings_snapshot()
+        if snapshot['watch']:
+            self.update_watched(snapshot)
+            return
+        key = self.result_key(snapshot)
+        cached = self.result_cache.get(key)
+        if cached is not None and self.data_is_current(snapshot):
+            self.window_slider.setEnabled(self.window_index() is not None)
+            self.draw_wind_rose(cached)
+            return
+        self.run_job('Updating wind rose', self.compute_rose,
+                     (snapshot, self.data, self.data_key, self.time_cube),
+                     lambda result: self.rose_ready(result, key))
+
+    def rose_ready(self, result, key=None):
+        accumulator = self.keep_computed(result, key)
+        self.draw_wind_rose(accumulator)
+
+    def keep_computed(self, result, key):
+        # Takes over the data and time cube a compute_rose job loaded or built,
+        # caches its counts and returns them
+        accumulator, data, cube = result
+        if data is not None:
+            self.data = data
+            self.data_key = self.load_key()
+        self.time_cube = cube
+        self.window_slider.setEnabled(cube is not None)
+        self.result_cache.put(key, accumulator)
+        return accumulator
+
+    def window_index(self):
+        # The time cube of the loaded data or the snapshot of the watched file,
+        # if it matches the current settings, for answering windows directly
+        speed_ranges, n_dir = self.get_speed_ranges(), self.dir_bins.value()
+        if self.time_cube is not None and self.time_cube.matches(speed_ranges, n_dir) and \
+                self.data_key == self.load_key():
+            return self.time_cube
+        if self.count_snapshot is not None and self.count_snapshot.matches(speed_ranges, n_dir):
+            return self.count_snapshot
+        return None
+
+    def slide_window(self, position):
+        # Keeps the window width and moves it across the data, redrawing straight
+        # from the time cube or snapshot without a background job
+        index = self.window_index()
+        if index is None:
+            return
+        span = index.time_range()
+        if span is None:
+            return
+        start, end = self.date_window()
+        width = max(0, end - start)
+        room = max(0, span[1] - span[0] - width)
+        start = span[0] + room * position // self.window_slider.maximum()
+        self.start_date.setDateTime(to_datetime(start))
+        self.end_date.setDateTime(to_datetime(start + width))
+        self.draw_wind_rose(index.query(*self.date_window()))
+
+    def draw_wind_rose(self, result):
         start_date_str = self.start_date.dateTime().toString('yyyy-MM-dd HH:mm')
         end_date_str = self.end_date.dateTime().toString('yyyy-MM-dd HH:mm')
-        filename = self.current_filename
-        if '/' in filename:
-            filename = filename.split('/')[-1]
-        info_text = (
-            f"Data Source: {filename}\n"
-            f"Date Range: {start_date_str} to {end_date_str}\n"
-            f"Prevailing Wind Direction: {prevailing_dir:.1f}°\n"
-            f"Average Wind Speed: {avg_speed:.1f} m/s\n"
-        )
-        ax_text.text(0.05, 0.95, info_text, \
-                    transform=ax_text.transAxes,
-                    verticalalignment='top',
-                    fontfamily='monospace')
-        self.figure.tight_layout()
-        self.canvas.draw()
+        with PROFILER.stage('render', result.total):
+            self.rose_renderer.draw(result, self.current_filename, start_date_str, end_date_str)
+        self.ax = self.rose_renderer.ax
 
     def load_excel(self):
         filename, _ = QFileDialog.getOpenFileName(self, "Select Excel file", "", \
+                                                "Data Files (*.xlsx *.xls *.csv *.tsv *.txt);;"
                                                 "Excel Files (*.xlsx *.xls);;All Files (*)")
         if filename:
+            # the workbook itself is only read if the column cache misses
+            self.data = None
+            self.stream_source = None
+            self.sources = None
+            self.station_tag = None
+            self.stop_watching()
+            self.current_filename = filename
+            self.reset_time_index()
+            self.result_cache.clear()
+            self.run_job(f"Loading {os.path.basename(filename)}", self.process_data,
+                         (self.settings_snapshot(),), self.data_loaded,
+                         LOAD_KEYS, "Error loading Excel file")
+
+    def data_loaded(self, result):
+        self.data = result
+        self.data_key = self.load_key()
+        span = self.data.time_range()
+        if span is not None:
+            self.start_date.setDateTime(to_datetime(span[0]))
+            self.end_date.setDateTime(to_datetime(span[1]))
+        self.window_slider.blockSignals(True)
+        self.window_slider.setValue(0)
+        self.window_slider.blockSignals(False)
+        self.update_wind_rose()
+
+    def open_files(self):
+        filenames, _ = QFileDialog.getOpenFileNames(self, "Select data files", "", \
+                                                  "Data Files (*.xlsx *.xls *.csv *.tsv *.txt);;"
+                                                  "All Files (*)")
+        if filenames:
+            self.load_files(filenames, f"{len(filenames)} files")
+
+    def open_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Select data folder")
+        if not folder:
+            return
+        from .multisource import expand_sources
+        filenames = expand_sources([folder])
+        if not filenames:
+            QMessageBox.warning(self, "Open Folder", f"No data files found in \n{folder}")
+            return
+        self.load_files(filenames, folder)
+
+    def ask_station_tag(self):
+        # Returns (tag, accepted); tag is None to merge the files into one dataset
+        names = [name for name, _ in STATION_TAG_CHOICES]
+        name, ok = QInputDialog.getItem(self, "Station Tags", "Label rows with their station?",
+                                        names, 0, False)
+        return dict(STATION_TAG_CHOICES).get(name), ok
+
+    def load_files(self, filenames, label):
+        # Files are read in parallel worker processes and merged into one
+        # time-sorted dataset without repeated timestamps
+        tag, ok = self.ask_station_tag()
+        if not ok:
+            return
+        self.data = None
+        self.stream_source = None
+        self.stop_watching()
+        self.sources = tuple(filenames)
+        self.station_tag = tag
+        self.current_filename = label
+        self.reset_time_index()
+        self.result_cache.clear()
+        self.run_job(f"Loading {len(filenames)} files", self.process_data,
+                     (self.settings_snapshot(),), self.data_loaded,
+                     LOAD_KEYS, "Error loading files")
+
+    def stream_file(self):
+        filename, _ = QFileDialog.getOpenFileName(self, "Select large data file", "", \
+                                                "Data Files (*.csv *.tsv *.txt *.xlsx);;All Files (*)")
+        if filename:
+            # nothing is kept in memory: every update re-reads the file in chunks
+            self.data = None
+            self.stop_watching()
+            self.stream_source = filename
+            self.sources = None
+            self.station_tag = None
+            self.current_filename = filename
+            self.reset_time_index()
+            self.result_cache.clear()
+            self.run_job(f"Streaming {os.path.basename(filename)}", self.compute_counts,
+                         (self.settings_snapshot(), None, False), self.stream_loaded,
+                         LOAD_KEYS, "Error streaming file")
+
+    def stream_loaded(self, result):
+        if result.first_time is None:
+            return
+        self.start_date.setDateTime(to_datetime(result.first_time))
+        self.end_date.setDateTime(to_datetime(result.last_time))
+        self.draw_wind_rose(result)
+
+    def watch_file(self):
+        filename, _ = QFileDialog.getOpenFileName(self, "Select file to watch", "", \
+                                                "Data Files (*.csv *.tsv *.txt *.xlsx);;All Files (*)")
+        if filename:
+            # counts are kept per time bucket and only rows appended since the
+            # last read are binned when the file changes
+            self.data = None
+            self.stream_source = None
+            self.sources = None
+            self.station_tag = None
+            self.stop_watching()
+            self.watch_source = filename
+            self.current_filename = filename
+            self.reset_time_index()
+            self.result_cache.clear()
+            self.file_watcher.addPath(filename)
+            self.run_job(f"Reading {os.path.basename(filename)}", self.update_snapshot,
+                         (self.settings_snapshot(), None), self.snapshot_ready,
+                         WATCH_KEYS, "Error reading watched file")
+
+    def stop_watching(self):
+        if self.file_watcher.files():
+            self.file_watcher.removePaths(self.file_watcher.files())
+        self.watch_timer.stop()
+        self.watch_source = None
+        self.count_snapshot = None
+
+    def watched_file_changed(self, path):
+        self.watch_timer.start()
+
+    def refresh_watched(self):
+        if self.watch_source is None:
+            return
+        if self.current_job is not None:
+            # never cancel another job for a refresh; try again later
+            self.watch_timer.start()
+            return
+        self.run_job(f"Reading new rows of {os.path.basename(self.watch_source)}",
+                     self.update_snapshot, (self.settings_snapshot(), self.count_snapshot),
+                     self.snapshot_ready, WATCH_KEYS, "Error reading watched file")
+
+    def update_watched(self, snapshot):
+        # Windows are answered from the snapshot; other bins need a new one
+        if self.count_snapshot is not None and \
+                self.count_snapshot.matches(snapshot['speed_ranges'], snapshot['n_dir']):
+            self.window_slider.setEnabled(True)
+            self.draw_wind_rose(self.count_snapshot.query(*snapshot['window']))
+            return
+        self.run_job(f"Reading {os.path.basename(snapshot['source'])}", self.update_snapshot,
+                     (snapshot, None), self.snapshot_ready, WATCH_KEYS,
+                     "Error reading watched file")
+
+    def update_snapshot(self, progress, snapshot, count_snapshot):
+        # Runs on a worker thread: starts from the stored snapshot for these bins
+        # when there is one, reads the new tail and stores the result
+        from .snapshot import CountSnapshot, append_tail, load_snapshot, snapshot_path
+        args = (snapshot['source'], snapshot['columns'], snapshot['speed_ranges'], snapshot['n_dir'])
+        if count_snapshot is None or \
+                not count_snapshot.matches(snapshot['speed_ranges'], snapshot['n_dir']):
+            count_snapshot = load_snapshot(*args) or \
+                CountSnapshot(snapshot['speed_ranges'], snapshot['n_dir'])
+        with PROFILER.stage('watch update') as stage:
+            updated = append_tail(count_snapshot, snapshot['source'], snapshot['columns'],
+                                  progress)
+            stage.rows = len(updated)
+        if updated.source != count_snapshot.source:
             try:
-                self.raw_data = pd.read_excel(filename)
-                self.current_filename = filename
-                self.data = self.process_data()
-                if self.data is not None:
-                    min_date = self.data['Date & Time'].min()
-                    max_date = self.data['Date & Time'].max()
-                    self.start_date.setDateTime(min_date)
-                    self.end_date.setDateTime(max_date)
-                    self.update_wind_rose()
-            except Exception as e:
-                QMessageBox.critical(self, "Error", f"Error loading Excel file: {str(e)}")
+                updated.save(snapshot_path(*args))
+            except OSError:
+                pass
+        return updated
 
-    def create_frequency_table(self):
-        if self.data is None:
-            return None
-        speed_bins = [0]
-        speed_labels = []
-        for range_widget in self.speed_ranges:
-            speed_bins.append(range_widget.max_speed.value())
-            min_val = range_widget.min_speed.value()
-            max_val = range_widget.max_speed.value()
-            label = f'{min_val}-{max_val}' if max_val < 100 else f'{min_val}+'
-            speed_labels.append(label)
-        dir_bins = np.linspace(0, 360, self.dir_bins.value() + 1)
-        dir_labels = [f"{i:.1f}" for i in dir_bins[:-1]]
-        mask = (self.data['Date & Time'] >= self.start_date.dateTime().toPyDateTime()) & \
-               (self.data['Date & Time'] <= self.end_date.dateTime().toPyDateTime())
-        filtered_data = self.data[mask]
-        filtered_data['speed_bin'] = pd.cut(filtered_data['Wind Speed'], 
-                                          bins=speed_bins, 
-                                          labels=speed_labels, 
-                                          include_lowest=True)
-        filtered_data['dir_bin'] = pd.cut(filtered_data['Wind Direction'], 
-                                         bins=dir_bins, 
-                                         labels=dir_labels, 
-                                         include_lowest=True)
-        index = pd.Index(speed_labels, name='speed_bin')
-        columns = pd.Index(dir_labels, name='dir_bin')
-        freq_table = pd.DataFrame(0, index=index, columns=columns)
-        counts = pd.crosstab(filtered_data['speed_bin'], 
-                            filtered_data['dir_bin'], 
-                            normalize=True) * 100
-        freq_table.update(counts)
-        return freq_table
+    def snapshot_ready(self, count_snapshot):
+        previous = self.count_snapshot.time_range() if self.count_snapshot is not None else None
+        self.count_snapshot = count_snapshot
+        # editors that replace the file drop it from the watcher
+        if self.watch_source not in self.file_watcher.files():
+            self.file_watcher.addPath(self.watch_source)
+        span = count_snapshot.time_range()
+        if span is None:
+            return
+        if previous is None:
+            self.start_date.setDateTime(to_datetime(span[0]))
+            self.end_date.setDateTime(to_datetime(span[1]))
+        elif self.date_window()[1] >= previous[1] - previous[1] % 10**9:
+            # the window reached the newest rows, so it follows them
+            self.end_date.setDateTime(to_datetime(span[1]))
+        self.window_slider.setEnabled(True)
+        self.draw_wind_rose(count_snapshot.query(*self.date_window()))
+
+    def export_counts(self, on_done):
+        # The table and XML exports reuse the counts of the current window when
+        # they are cached or the time cube is current, and otherwise bin it in
+        # the background; on_done gets the accumulator and its frequency table.
+        # Data loaded with other settings (such as another row window) is loaded
+        # again first, so the export and the cache entry match the settings.
+        if self.data is None and self.stream_source is None and self.watch_source is None:
+            return
+        snapshot = self.settings_snapshot()
+        key = self.result_key(snapshot)
+        if not self.data_is_current(snapshot):
+            self.run_job('Building frequency table', self.compute_rose,
+                         (snapshot, self.data, self.data_key, self.time_cube),
+                         lambda result: self.export_ready(key, on_done,
+                                                          self.keep_computed(result, key)))
+            return
+        result = self.result_cache.get(key)
+        index = self.window_index()
+        if result is None and index is not None:
+            result = index.query(*snapshot['window'])
+        if result is not None:
+            self.export_ready(key, on_done, result)
+            return
+        self.run_job('Building frequency table', self.compute_counts, (snapshot, self.data),
+                     lambda result: self.export_ready(key, on_done, result))
+
+    def export_ready(self, key, on_done, result):
+        self.result_cache.put(key, result)
+        from .export import frequency_table
+
+        unbinned = self.unbinned_action.isChecked()
+
+        def table():
+            with PROFILER.stage('frequency table', result.total):
+                return frequency_table(result, unbinned)
+
+        name = 'unbinned table' if unbinned else 'table'
+        on_done(result, self.result_cache.derived(key, name, table))
+
+    def set_interval_method(self, method):
+        self.interval_method = method
+
+    def export_with_intervals(self, on_done):
+        # Like export_counts, with the confidence intervals of the window (None
+        # while they are off) as a third argument to on_done
+        self.export_counts(lambda result, freq_table:
+                           self.export_intervals(on_done, result, freq_table))
+
+    def export_intervals(self, on_done, result, freq_table):
+        method = self.interval_method
+        if method is None:
+            on_done(result, freq_table, None)
+            return
+        snapshot = self.settings_snapshot()
+        key = self.result_key(snapshot)
+        if not self.data_is_current(snapshot):
+            # export_counts has just loaded the data for these settings, so this
+            # only happens if they changed since; such intervals are not cached
+            key = None
+        key = None if key is None else (key, 'intervals', method)
+        intervals = self.result_cache.get(key)
+        if intervals is not None:
+            on_done(result, freq_table, intervals)
+            return
+        self.run_job('Computing confidence intervals', self.compute_intervals,
+                     (snapshot, method, self.data, self.count_snapshot),
+                     lambda intervals: self.intervals_ready(key, on_done, result, freq_table,
+                                                            intervals))
+
+    def compute_intervals(self, progress, snapshot, method, data, count_snapshot):
+        # The per-day counts of the window, resampled; a watched file's are taken
+        # from its snapshot at the same bucket resolution as its roses
+        start, end = snapshot['window']
+        speed_ranges, n_dir = snapshot['speed_ranges'], snapshot['n_dir']
+        if snapshot['watch'] and count_snapshot is not None and \
+                count_snapshot.matches(speed_ranges, n_dir):
+            counts = BlockCounts.from_snapshot(count_snapshot, start, end)
+        elif snapshot['stream'] or snapshot['watch']:
+            from .streaming import stream_into
+            counts = stream_into(BlockCounts(speed_ranges, n_dir, start, end),
+                                 snapshot['source'], snapshot['columns'],
+                                 snapshot['first_row'], snapshot['last_row'], progress=progress)
+        else:
+            counts = feed_columns(BlockCounts(speed_ranges, n_dir, start, end),
+                                  *data.columns, progress)
+        with PROFILER.stage('intervals', counts.total):
+            return confidence_intervals(counts, method, progress=progress)
+
+    def intervals_ready(self, key, on_done, result, freq_table, intervals):
+        self.result_cache.put(key, intervals)
+        on_done(result, freq_table, intervals)
+
+    def compute_groups(self, progress, snapshot, grouping, data):
+        grouped = GroupedCounts(grouping, snapshot['speed_ranges'], snapshot['n_dir'],
+                                *snapshot['window'])
+        with PROFILER.stage(f'{grouping} roses') as stage:
+            if snapshot['stream'] or snapshot['watch']:
+                from .streaming import stream_into
+                stream_into(grouped, snapshot['source'], snapshot['columns'],
+                            snapshot['first_row'], snapshot['last_row'], progress=progress)
+            else:
+                feed_columns(grouped, *data.columns, progress)
+            stage.rows = int(grouped.totals.sum())
+        return grouped
+
+    def show_grouped(self, grouping):
+        if self.data is None and self.stream_source is None and self.watch_source is None:
+            return
+        self.run_job(f'Computing {grouping} wind roses', self.compute_groups,
+                     (self.settings_snapshot(), grouping, self.data), self.grouped_ready)
+
+    def compute_stations(self, progress, snapshot, data):
+        grouped = GroupedCounts('station', snapshot['speed_ranges'], snapshot['n_dir'],
+                                *snapshot['window'], labels=data.station_labels)
+        with PROFILER.stage('station roses', len(data)):
+            return feed_columns(grouped, *data.columns, progress, groups=data.stations)
+
+    def show_stations(self):
+        if self.data is None or self.data.stations is None:
+            QMessageBox.information(self, "Compare Stations",
+                                    "Open several files or a folder with station tags first.")
+            return
+        self.run_job('Computing station wind roses', self.compute_stations,
+                     (self.settings_snapshot(), self.data), self.grouped_ready)
+
+    def grouped_ready(self, grouped):
+        start_date_str = self.start_date.dateTime().toString('yyyy-MM-dd HH:mm')
+        end_date_str = self.end_date.dateTime().toString('yyyy-MM-dd HH:mm')
+        dialog = GroupedRoseDialog(f'Wind Roses by {grouped.grouping.title()}', self)
+        draw_grouped(dialog.figure, grouped, self.current_filename,
+                     start_date_str, end_date_str, self.default_colors)
+        dialog.canvas.draw()
+        dialog.export_image_button.clicked.connect(lambda: self.export_grouped_image(dialog))
+        dialog.export_table_button.clicked.connect(lambda: self.export_grouped_table(grouped))
+        dialog.export_xml_button.clicked.connect(lambda: self.export_grouped_XML(grouped))
+        dialog.show()
+
+    def export_grouped_image(self, dialog):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Grouped Wind Rose Image", "",
+                                                 "PNG Files (*.png);;JPEG Files (*.jpg);;All Files (*)")
+        if file_path:
+            dialog.figure.savefig(file_path, dpi=300, bbox_inches='tight')
+            QMessageBox.information(self, "Export Successful", f"Image exported to \n{file_path}")
+
+    def export_grouped_table(self, grouped):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Grouped Wind Rose Tables", "",
+                                                 "Excel Files (*.xlsx);;All Files (*)")
+        if file_path:
+            from .export import write_group_tables
+            write_group_tables(grouped, file_path, self.unbinned_action.isChecked())
+            QMessageBox.information(self, "Export Successful", f"Tables exported to \n{file_path}")
+
+    def export_grouped_XML(self, grouped):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Grouped Wind Rose XML", "",
+                                                 "XML Files (*.xml);;All Files (*)")
+        if file_path:
+            from .export import write_group_xml
+            written = write_group_xml(grouped, file_path, self.unbinned_action.isChecked())
+            QMessageBox.information(self, "Export Successful",
+                                    f"{len(written)} XML files exported next to \n{file_path}")
 
     def export_image(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Wind Rose Image", "",
                                                  "PNG Files (*.png);;JPEG Files (*.jpg);;All Files (*)")
         if file_path:
             try:
-                self.figure.savefig(file_path, dpi=300, bbox_inches='tight')
+                with PROFILER.stage('export image'):
+                    self.figure.savefig(file_path, dpi=300, bbox_inches='tight')
                 QMessageBox.information(self, "Export Successful", f"Image exported to \n{file_path}")
             except Exception as e:
                 print(f"Error saving image: {e}")
 
     def export_table(self):
-        freq_table = self.create_frequency_table()
-        if freq_table is None:
-            return
+        self.export_with_intervals(self.save_table)
+
+    def save_table(self, result, freq_table, intervals=None):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Wind Rose Table", "", 
                                                  "Excel Files (*.xlsx);;All Files (*)")
         if file_path:
-            freq_table.to_excel(file_path)
+            from .export import write_table
+            with PROFILER.stage('export table', result.total):
+                write_table(freq_table, file_path, intervals)
             QMessageBox.information(self, "Export Successful", f"Table exported to \n{file_path}")
 
     def export_XML(self):
-        freq_table = self.create_frequency_table()
-        if freq_table is None:
-            return
+        self.export_with_intervals(self.save_XML)
+
+    def save_XML(self, result, freq_table, intervals=None):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save Wind Rose XML", "", 
                                                  "XML Files (*.xml);;All Files (*)")
         if file_path:
-            root = ET.Element("Data")
-            ET.SubElement(root, "Information").text = "Wind Rose Data"
-            ET.SubElement(root, "Name").text = "WindRose"
-            velocity_bands = " ".join(str(widget.max_speed.value()) 
-                                    for widget in self.speed_ranges)
-            ET.SubElement(root, "Velocity_Bands").text = velocity_bands
-            headings_probabilities = ET.SubElement(root, "Headings_Probabilities")
-            for column in freq_table.columns:
-                heading_prob = ET.SubElement(headings_probabilities, "Heading_Probabilities")
-                heading_prob.text = " ".join(f"{val/100:.4f}" for val in freq_table[column])
-            tree = ET.ElementTree(root)
-            tree.write(file_path, xml_declaration=True, encoding='utf-8', method="xml")
+            from .export import write_xml
+            with PROFILER.stage('export XML', result.total):
+                write_xml(freq_table, result.speed_ranges, file_path, intervals)
             QMessageBox.information(self, "Export Successful", f"XML exported to \n{file_path}") 
\ No newline at end of file
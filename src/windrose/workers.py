@@ -0,0 +1,45 @@
+import threading
+
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class Cancelled(Exception):
+    pass
+
+
+class WorkerSignals(QObject):
+    progress = pyqtSignal(int, str)
+    finished = pyqtSignal(object)
+    failed = pyqtSignal(object)
+
+
+class Worker(QRunnable):
+    # Runs fn(progress, *args) on a pool thread. fn reports through progress,
+    # which raises Cancelled once cancel() has been called; results and errors
+    # come back to the GUI thread through queued signals.
+
+    def __init__(self, fn, *args):
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.signals = WorkerSignals()
+        self._cancelled = threading.Event()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def is_cancelled(self):
+        return self._cancelled.is_set()
+
+    def report(self, percent, message):
+        if self._cancelled.is_set():
+            raise Cancelled()
+        self.signals.progress.emit(int(percent), message)
+
+    def run(self):
+        try:
+            result = self.fn(self.report, *self.args)
+        except Exception as e:
+            self.signals.failed.emit(e)
+        else:
+            self.signals.finished.emit(result)